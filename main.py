@@ -2,7 +2,8 @@
 # -*- coding: utf-8 -*-
 """
 Crawler para https://vcresearch.berkeley.edu/faculty-expertise
-- Selenium para clicar "Load more" y cargar toda la lista
+- Carga toda la lista pidiendo las páginas a /views/ajax de Drupal
+  (fallback: Selenium clicando "Load more")
 - Extrae emails/nombres en la lista
 - Visita fichas personales y extrae email + nombre + departamento
 - Guarda en SQLite y exporta CSV raw + CSV CRM
@@ -18,32 +19,99 @@ Ejemplo:
 """
 
 import argparse
-import hashlib
+import csv
+import json
+import multiprocessing
 import os
 import re
 import shutil
 import sqlite3
+import string
+import threading
 import time
 import uuid
-from urllib.parse import urlparse, urljoin
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from html import unescape
+from urllib.parse import urlsplit, urljoin
 
 import pandas as pd
 import requests
-import tldextract
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError as URLLib3Error
+from urllib3.util.retry import Retry
+import xxhash
+from bs4 import BeautifulSoup, SoupStrainer
+import soupsieve as sv
 from unidecode import unidecode
 
 # Selenium (usando Selenium Manager; no webdriver_manager)
 from selenium import webdriver
-from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
 from selenium.common.exceptions import (
     TimeoutException, NoSuchElementException, StaleElementReferenceException, ElementClickInterceptedException
 )
 
 BERKELEY_DOMAIN = "berkeley.edu"
 EMAIL_RE = re.compile(r'\b([A-Za-z0-9._%+\-]+@berkeley\.edu)\b', re.I)
+# Prefiltro: buscar el literal es mucho más barato que pasar EMAIL_RE por toda la página
+EMAIL_ANCHOR_RE = re.compile(r'@berkeley\.edu', re.I)
+EMAIL_LOCAL_CHARS = frozenset(string.ascii_letters + string.digits + "._%+-")
+H1_RE = re.compile(r'<h1[^>]*>(.*?)</h1>', re.I | re.S)
+# Si el HTML crudo no contiene ninguna de estas palabras, extract_department() devuelve ""
+DEPT_HINT_RE = re.compile(r'department|affiliation|school|division', re.I)
+DEPT_HDR_RE = re.compile(r'\bDepartment\b|\bAffiliation\b|\bSchool\b|\bDivision\b', re.I)
+DEPT_VAL_RE = re.compile(r'Department(?: of)?[:\s]+(.+?)(?:\s{2,}|$)', re.I)
+# unidecode siempre devuelve ASCII: basta una tabla de 128 entradas para quitar lo que no sea [a-z0-9]
+NON_ALNUM_TABLE = {c: None for c in range(128) if chr(c) not in string.ascii_lowercase + string.digits}
+# acentos latinos frecuentes -> ASCII (mismo resultado que unidecode); el resto sigue pasando por unidecode
+_ACCENT_TRANS = str.maketrans("áàäâãåéèëêíìïîóòöôõúùüûñçý", "aaaaaaeeeeiiiiooooouuuuncy")
 ROLE_HINTS = re.compile(r'\b(Professor|Assistant Professor|Associate Professor|Lecturer|Faculty|Staff|Researcher|Chair|Dean)\b', re.I)
 
+LIST_NAME_SELECTORS = (
+    ".view-content .views-row h3 a",
+    ".view-content .views-row h3",
+    ".view-content .views-row .field--name-title a",
+    ".view-content .views-row .field--name-title",
+)
+TITLE_SELECTORS = ("h1", "h2", ".page-title", ".node--title", "header h1", ".title")
+# todos los selectores de título en una sola consulta; cada uno compilado aparte para saber con cuál casa
+TITLE_SEL = sv.compile(", ".join(TITLE_SELECTORS))
+TITLE_SEL_EACH = tuple(sv.compile(sel) for sel in TITLE_SELECTORS)
+DEPT_BLOCK_SELECTORS = ("dl", ".field", ".profile-meta", ".node__meta", ".sidebar", ".field--name-field-department")
+
+# Solo se construyen en el árbol los nodos que consultan los selectores de arriba
+LIST_STRAINER = SoupStrainer(class_=re.compile(r'(?:^|\s)view-content(?:\s|$)'))
+PROFILE_TAGS = frozenset(("h1", "h2", "dl"))
+PROFILE_CLASS_RE = re.compile(
+    r'(?:^|\s)(?:field|field--name-field-department|profile-meta|node__meta|sidebar'
+    r'|page-title|node--title|title|department)(?:\s|$)'
+)
+
+
+def _keep_profile_tag(name, attrs):
+    attrs = attrs or {}
+    cls = attrs.get("class") or ""
+    if not isinstance(cls, str):
+        cls = " ".join(cls)
+    return name in PROFILE_TAGS or "itemscope" in attrs or bool(PROFILE_CLASS_RE.search(cls))
+
+
+try:
+    from bs4 import ElementFilter  # bs4 >= 4.13: las funciones de SoupStrainer ya no reciben attrs
+
+    class _ProfileFilter(ElementFilter):
+        def allow_tag_creation(self, nsprefix, name, attrs):
+            return _keep_profile_tag(name, attrs)
+
+        def allow_string_creation(self, string):
+            return False
+
+    PROFILE_STRAINER = _ProfileFilter()
+except ImportError:
+    PROFILE_STRAINER = SoupStrainer(_keep_profile_tag)
+
 
 # ---------------------------
 # CLI
@@ -51,28 +119,41 @@ ROLE_HINTS = re.compile(r'\b(Professor|Assistant Professor|Associate Professor|L
 def parse_args():
     ap = argparse.ArgumentParser()
     ap.add_argument("--url", required=True, help="Listado, p.ej. https://vcresearch.berkeley.edu/faculty-expertise")
+    ap.add_argument("--list-mode", choices=["auto", "ajax", "selenium"], default="auto",
+                    help="auto: /views/ajax de Drupal y, si no es posible, Selenium")
     ap.add_argument("--headless", type=int, default=1)
-    ap.add_argument("--max-clicks", type=int, default=250)
-    ap.add_argument("--wait-after-click", type=float, default=1.4)
+    ap.add_argument("--max-clicks", type=int, default=250, help="Máx. clicks 'Load more' (o páginas AJAX)")
+    ap.add_argument("--wait-after-click", type=float, default=10.0,
+                    help="Espera máx. (seg) a que aparezcan tarjetas nuevas tras cada click")
     ap.add_argument("--card-css", default=".view-content .views-row", help="Selectores (separados por coma) para contar 'tarjetas'")
     ap.add_argument("--out-csv", default="berkeley_faculty.csv")
     ap.add_argument("--db", default="berkeley_faculty.db")
     # tuning fichas
     ap.add_argument("--max-profiles", type=int, default=1000, help="Máx. fichas a visitar")
-    ap.add_argument("--profile-delay", type=float, default=0.5, help="Delay entre fichas (seg)")
+    ap.add_argument("--profile-delay", type=float, default=0.5, help="Separación mínima (seg) entre descargas de fichas, sumando todos los workers")
+    ap.add_argument("--workers", type=int, default=10, help="Descargas de fichas en paralelo")
+    ap.add_argument("--parse-workers", type=int, default=os.cpu_count() or 1, help="Procesos para parsear fichas")
     return ap.parse_args()
 
 
 def same_registered_domain(url, target_domain):
-    host = urlparse(url).netloc
-    ext = tldextract.extract(host)
-    reg = ".".join([p for p in [ext.domain, ext.suffix] if p])
-    return reg.lower() == target_domain.lower()
+    # hostname ya viene en minúsculas y sin puerto ni credenciales
+    host = urlsplit(url).hostname or ""
+    target_domain = target_domain.lower()
+    return host == target_domain or host.endswith("." + target_domain)
 
 
 # ---------------------------
 # Driver Chrome robusto (WSL/containers)
 # ---------------------------
+# Recursos que no aportan nada al HTML (el CSS se deja: afecta a la visibilidad de los botones)
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.mp4", "*.webm",
+    "*/analytics*", "*googletagmanager*", "*google-analytics*", "*doubleclick*",
+]
+
+
 def build_driver(headless=True):
     chrome_bin = os.environ.get("CHROME_BINARY") or shutil.which("google-chrome") or shutil.which("google-chrome-stable")
     if not chrome_bin:
@@ -88,50 +169,75 @@ def build_driver(headless=True):
     opts.add_argument("--disable-software-rasterizer")
     opts.add_argument("--remote-debugging-port=0")
     opts.add_argument("--no-zygote")
-    opts.add_argument("--window-size=1440,2400")
+    opts.add_argument("--window-size=1024,768")
     # perfiles temporales en /tmp
     opts.add_argument("--user-data-dir=/tmp/chrome-profile")
     opts.add_argument("--data-path=/tmp/chrome-data")
     opts.add_argument("--disk-cache-dir=/tmp/chrome-cache")
+    # solo necesitamos el HTML: no descargar imágenes ni pedir permisos de notificación
+    opts.add_argument("--blink-settings=imagesEnabled=false")
+    opts.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.default_content_setting_values.notifications": 2,
+    })
     opts.binary_location = chrome_bin
 
-    return webdriver.Chrome(options=opts)
+    driver = webdriver.Chrome(options=opts)
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+    except Exception as e:
+        print(f"[DRIVER] No se pudo activar el bloqueo de recursos por CDP: {e}")
+    return driver
 
 
 # ---------------------------
 # Utilidades de listado (click & count)
 # ---------------------------
+COUNT_CARDS_JS = """
+let total = 0;
+for (const sel of arguments[0]) {
+    try { total += document.querySelectorAll(sel).length; } catch (e) { /* selector inválido */ }
+}
+return total;
+"""
+
+
 def count_cards(driver, css_list):
-    total = 0
-    for sel in css_list:
-        try:
-            elems = driver.find_elements(By.CSS_SELECTOR, sel.strip())
-            total += len(elems)
-        except Exception:
-            pass
-    return total
+    """Cuenta tarjetas en un único execute_script, sin materializar WebElements."""
+    try:
+        return driver.execute_script(COUNT_CARDS_JS, [s.strip() for s in css_list]) or 0
+    except Exception:
+        return 0
+
+
+# Mismo filtro que antes, pero evaluado en el navegador: 1 round-trip en vez de ~4 por elemento.
+# Solo se usa el primer candidato, así que se devuelve como mucho uno.
+FIND_LOAD_MORE_JS = """
+const phrases = ['load more', 'show more', 'more results', 'view more', 'load additional'];
+const el = [...document.querySelectorAll("button, a, [role='button']")].find(el => {
+    let txt = (el.innerText || '').trim().toLowerCase();
+    if (!txt) {
+        txt = (el.getAttribute('aria-label') || el.getAttribute('title') || '').trim().toLowerCase();
+    }
+    const cls = (el.getAttribute('class') || '').toLowerCase();
+    const action = (el.getAttribute('data-action') || '').toLowerCase();
+    return phrases.some(p => txt.includes(p))
+        || cls.includes('load-more') || cls.includes('loadmore') || cls.includes('pager__item--more')
+        || action.includes('load-more');
+});
+return el ? [el] : [];
+"""
 
 
 def find_candidate_buttons(driver):
-    cands = []
-    elems = driver.find_elements(By.XPATH, "//button|//a|//*[@role='button']")
-    for el in elems:
-        try:
-            txt = (el.text or "").strip().lower()
-            if not txt:
-                txt = ((el.get_attribute("aria-label") or el.get_attribute("title")) or "").strip().lower()
-            cls = (el.get_attribute("class") or "").lower()
-            data_action = (el.get_attribute("data-action") or "").lower()
-            if any(s in txt for s in ["load more", "show more", "more results", "view more", "load additional"]) \
-               or "load-more" in cls or "loadmore" in cls or "pager__item--more" in cls \
-               or "load-more" in data_action:
-                cands.append(el)
-        except Exception:
-            continue
-    return cands
+    try:
+        return driver.execute_script(FIND_LOAD_MORE_JS) or []
+    except Exception:
+        return []
 
 
-def click_load_more_until_end(driver, css_list, max_clicks=250, wait_after_click=1.4):
+def click_load_more_until_end(driver, css_list, max_clicks=250, wait_after_click=10.0):
     css_list = [s for s in (css_list or []) if s and s.strip()]
     prev_count = count_cards(driver, css_list)
     print(f"[CLICK] Tarjetas iniciales: {prev_count}")
@@ -144,8 +250,11 @@ def click_load_more_until_end(driver, css_list, max_clicks=250, wait_after_click
 
     while clicks < max_clicks:
         driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(0.5)
-        cands = find_candidate_buttons(driver)
+        try:
+            cands = WebDriverWait(driver, min(wait_after_click, 2.0), poll_frequency=0.1).until(
+                find_candidate_buttons)
+        except TimeoutException:
+            cands = []
         print(f"[CLICK] Candidatos botón: {len(cands)}")
         if not cands:
             print("[CLICK] No hay botón 'Load more' visible. Paro clicks.")
@@ -164,7 +273,12 @@ def click_load_more_until_end(driver, css_list, max_clicks=250, wait_after_click
                 break
 
         clicks += 1
-        time.sleep(wait_after_click)
+        # en cuanto el DOM crece seguimos; wait_after_click es solo el tope
+        try:
+            WebDriverWait(driver, wait_after_click, poll_frequency=0.1).until(
+                lambda d: count_cards(d, css_list) > prev_count)
+        except TimeoutException:
+            pass
 
         cur = count_cards(driver, css_list)
         print(f"[CLICK] Click #{clicks} ⇒ tarjetas: {cur}")
@@ -177,29 +291,142 @@ def click_load_more_until_end(driver, css_list, max_clicks=250, wait_after_click
     return clicks
 
 
+def load_list_with_selenium(args):
+    """Listado completo clicando 'Load more' en Chrome. Devuelve (html, url_final)."""
+    driver = build_driver(headless=bool(args.headless))
+    try:
+        driver.get(args.url)
+        css_list = [s.strip() for s in args.card_css.split(",") if s.strip()]
+
+        print("[MAIN] Página cargada. Intento 'Load more'...")
+        click_load_more_until_end(
+            driver,
+            css_list=css_list,
+            max_clicks=args.max_clicks,
+            wait_after_click=args.wait_after_click
+        )
+
+        print("[MAIN] Extrayendo HTML final y parseando...")
+        return driver.page_source, driver.current_url
+    finally:
+        driver.quit()
+
+
+# ---------------------------
+# Listado sin navegador: endpoint /views/ajax de Drupal
+# ---------------------------
+DRUPAL_SETTINGS_RE = re.compile(
+    r'<script[^>]*data-drupal-selector="drupal-settings-json"[^>]*>(.*?)</script>', re.S)
+
+
+def load_list_via_views_ajax(sess, url, max_pages=250):
+    """Reproduce el 'Load more' de una vista Drupal pidiendo page=1,2,... a /views/ajax.
+
+    Devuelve el HTML de la página con los fragmentos de cada página añadidos
+    (envueltos en .view-content si hace falta), o None si la página no expone
+    una vista AJAX.
+    """
+    r = sess.get(url, timeout=15)
+    r.raise_for_status()
+    html = r.text
+
+    m = DRUPAL_SETTINGS_RE.search(html)
+    if not m:
+        return None
+    settings = json.loads(m.group(1))
+    views_settings = (settings.get("views") if isinstance(settings, dict) else None) or {}
+    ajax_views = (views_settings.get("ajaxViews") if isinstance(views_settings, dict) else None) or {}
+    if not isinstance(ajax_views, dict) or not ajax_views:
+        return None
+    view = next(iter(ajax_views.values()))
+    if not isinstance(view, dict):
+        return None
+    ajax_url = urljoin(url, views_settings.get("ajax_path") or "/views/ajax")
+
+    fragments = []
+    prev = None
+    for page in range(1, max_pages + 1):
+        form = {
+            "view_name": view["view_name"],
+            "view_display_id": view["view_display_id"],
+            "view_args": view.get("view_args", ""),
+            "view_path": view.get("view_path", ""),
+            "view_base_path": view.get("view_base_path", ""),
+            "view_dom_id": view.get("view_dom_id", ""),
+            "pager_element": view.get("pager_element", 0),
+            "page": page,
+            "_drupal_ajax": 1,
+        }
+        # Drupal responde 200 con un dict de error si rechaza el formulario: solo vale una lista de comandos
+        try:
+            resp = sess.post(ajax_url, data=form, timeout=15)
+            if resp.status_code != 200:
+                raise ValueError(f"HTTP {resp.status_code}")
+            payload = resp.json()
+            if not isinstance(payload, list):
+                raise ValueError(f"respuesta inesperada ({type(payload).__name__})")
+        except (requests.RequestException, ValueError) as e:
+            print(f"[AJAX] page={page} ⇒ {e}. Paro.")
+            if page == 1:
+                return None  # el endpoint no responde: que decida el llamador (Selenium)
+            break  # se conservan las páginas ya descargadas
+        data = "".join(
+            c["data"] for c in payload
+            if isinstance(c, dict) and c.get("command") == "insert" and isinstance(c.get("data"), str)
+        )
+        if "views-row" not in data or data == prev:
+            print(f"[AJAX] page={page} sin tarjetas nuevas. Paro.")
+            break
+        if "view-content" not in data:
+            data = f'<div class="view-content">{data}</div>'
+        fragments.append(data)
+        prev = data
+        print(f"[AJAX] page={page} ⇒ {data.count('views-row')} tarjetas")
+
+    print(f"[AJAX] Hecho. Páginas extra: {len(fragments)}")
+    return html + "".join(fragments)
+
+
 # ---------------------------
 # Extracción básica
 # ---------------------------
 def extract_emails_from_html(html):
-    return set(m.group(1).lower() for m in EMAIL_RE.finditer(html or ""))
+    """EMAIL_RE solo alrededor de cada '@berkeley.edu' (mismos resultados que finditer)."""
+    emails = set()
+    if not html:
+        return emails
+    last_end = 0
+    for anchor in EMAIL_ANCHOR_RE.finditer(html):
+        if anchor.start() < last_end:
+            continue
+        # retroceder hasta el inicio de la parte local
+        start = anchor.start()
+        while start > last_end and html[start - 1] in EMAIL_LOCAL_CHARS:
+            start -= 1
+        # +1 para que \b vea el carácter siguiente
+        m = EMAIL_RE.search(html, start, anchor.end() + 1)
+        if m:
+            emails.add(m.group(1).lower())
+            last_end = m.end()
+    return emails
+
 
+def scan_page(html, parse=False):
+    """Una sola pasada de EMAIL_RE por página; el árbol DOM solo si se pide."""
+    emails = extract_emails_from_html(html)
+    soup = BeautifulSoup(html, "lxml", parse_only=LIST_STRAINER) if parse else None
+    return emails, soup
 
-def extract_names_from_list_html(html):
+
+def extract_names_from_list_html(soup):
     """Nombres desde encabezados/enlaces comunes de tarjeta."""
-    soup = BeautifulSoup(html, "html.parser")
-    selectors = [
-        ".view-content .views-row h3 a",
-        ".view-content .views-row h3",
-        ".view-content .views-row .field--name-title a",
-        ".view-content .views-row .field--name-title",
-    ]
     names = set()
-    for sel in selectors:
+    for sel in LIST_NAME_SELECTORS:
         for el in soup.select(sel):
             txt = (el.get_text(" ", strip=True) or "").strip()
             if 2 <= len(txt.split()) <= 4:
                 names.add(txt)
-    return names, soup
+    return names
 
 
 def split_first_last(full_name):
@@ -211,32 +438,81 @@ def split_first_last(full_name):
     return parts[0], parts[-1]
 
 
+@lru_cache(maxsize=8192)
+def _norm(s):
+    """Nombre -> ascii minúsculas sin símbolos (cacheado: los nombres se repiten)."""
+    s = s.strip().lower()
+    if not s.isascii():
+        s = s.translate(_ACCENT_TRANS)
+        if not s.isascii():
+            s = unidecode(s)
+    return s.translate(NON_ALNUM_TABLE)
+
+
 def generate_email(first_name, last_name):
     if not first_name or not last_name:
         return None
-    f = unidecode(first_name.strip().lower())
-    l = unidecode(last_name.strip().lower())
-    l = re.sub(r"[^a-z0-9]", "", l)
+    f = _norm(first_name)
+    l = _norm(last_name)
+    if not f or not l:
+        return None
     return f"{f[0]}{l}@berkeley.edu"
 
 
+# Misma función que abs_url en "uc3m /_http.py": los scrapers UC3M no son importables
+# desde aquí (directorio aparte, sin paquete). Mantener ambas copias iguales.
+def abs_url(base, href):
+    """urljoin solo para enlaces relativos: un href http(s) absoluto ya es la URL final."""
+    if href.startswith(("http://", "https://")):
+        return href
+    return urljoin(base, href)
+
+
 def is_profile_like(href: str) -> bool:
     href_l = href.lower()
     return any(p in href_l for p in ["/faculty/", "/people/", "/profile", "/profiles/", "/user/", "/directory/"])
 
 
+def extract_h1_title(html):
+    """Título desde el primer <h1> con texto plano, sin construir el árbol DOM."""
+    m = H1_RE.search(html or "")
+    if not m or "<" in m.group(1):
+        return None
+    return unescape(m.group(1)).strip() or None
+
+
+def extract_title(detail_soup):
+    # primer elemento de cada selector (lo que daría select_one) con un solo recorrido del árbol
+    first = [None] * len(TITLE_SEL_EACH)
+    for el in TITLE_SEL.select(detail_soup):
+        for i, sel in enumerate(TITLE_SEL_EACH):
+            if first[i] is None and sel.match(el):
+                first[i] = el
+    title = None
+    for el in first:
+        if el:
+            title = (el.get_text(" ", strip=True) or "").strip()
+            if title:
+                break
+    if not title:
+        el = detail_soup.select_one('[itemscope][itemtype*="Person" i] [itemprop="name"]')
+        if el:
+            title = (el.get_text(" ", strip=True) or "").strip()
+    return title
+
+
 def extract_department(detail_soup):
     candidates = []
-    for sel in ["dl", ".field", ".profile-meta", ".node__meta", ".sidebar", ".field--name-field-department"]:
+    for sel in DEPT_BLOCK_SELECTORS:
         for block in detail_soup.select(sel):
             txt = block.get_text(" ", strip=True)
             if not txt:
                 continue
-            if re.search(r"\bDepartment\b", txt, flags=re.I) or re.search(r"\bAffiliation\b|\bSchool\b|\bDivision\b", txt, flags=re.I):
+            if DEPT_HDR_RE.search(txt):
                 candidates.append(txt)
 
     for txt in candidates:
-        m = re.search(r"Department(?: of)?[:\s]+(.+?)(?:\s{2,}|$)", txt, flags=re.I)
+        m = DEPT_VAL_RE.search(txt)
         if m:
             dep = m.group(1).strip()
             if 0 < len(dep) <= 200:
@@ -250,12 +526,174 @@ def extract_department(detail_soup):
     return ""
 
 
+# ---------------------------
+# Fichas personales (descarga concurrente)
+# ---------------------------
+PROFILE_HEADERS = {"User-Agent": "SophIA-ResearchBot/1.0 (+contact: outreach@sophia.ai)"}
+
+
+def build_session(pool_size=20):
+    """Session con pool de conexiones keep-alive y reintentos con backoff."""
+    sess = requests.Session()
+    sess.headers.update(PROFILE_HEADERS)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                          max_retries=Retry(total=2, backoff_factor=0.3))
+    sess.mount("https://", adapter)
+    sess.mount("http://", adapter)
+    return sess
+
+
+# Misma clase que RateLimiter en "uc3m /_http.py" (mismo motivo que abs_url: el
+# directorio UC3M no es importable desde aquí). Mantener ambas copias iguales.
+class RateLimiter:
+    """Espaciado mínimo entre inicios de petición, compartido por todos los hilos."""
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        if self.min_interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.min_interval
+        time.sleep(start - now)
+
+
+def fetch_profile(sess, link, limiter=None):
+    """Descarga una ficha. Devuelve (link, html) o (link, None) si no es HTML válido."""
+    if limiter is not None:
+        limiter.wait()
+    try:
+        r = sess.get(link, timeout=12, stream=True)
+    except requests.RequestException:
+        return link, None
+    with r:
+        if r.status_code != 200:
+            return link, None
+        if "text/html" not in r.headers.get("Content-Type",""):
+            return link, None
+        # página completa: título, departamento y emails pueden estar en cualquier parte
+        # (con stream=True, lo que no es HTML ni siquiera se descarga)
+        try:
+            raw = r.raw.read(decode_content=True)
+        except (requests.RequestException, URLLib3Error, OSError):
+            return link, None
+    try:
+        return link, raw.decode(r.encoding or "utf-8", errors="replace")
+    except LookupError:  # charset desconocido en la cabecera
+        return link, raw.decode("utf-8", errors="replace")
+
+
+# Los procesos de parseo arrancan con los hilos de descarga ya en marcha: fork() copiaría
+# locks tomados (p. ej. del pool de urllib3) y podría bloquearse. forkserver/spawn no heredan hilos.
+PARSE_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+
+def parse_profile_html(detail_html):
+    """Parseo puro de una ficha -> (emails, título, departamento); None si falla.
+
+    Es una función de módulo para poder ejecutarse en un ProcessPoolExecutor.
+    """
+    try:
+        emails, _ = scan_page(detail_html)
+
+        # nombre y departamento en ficha: solo construimos el árbol si hace falta
+        title = extract_h1_title(detail_html)
+        detail_soup = None
+        if not title or DEPT_HINT_RE.search(detail_html):
+            detail_soup = BeautifulSoup(detail_html, "lxml", parse_only=PROFILE_STRAINER)
+        if not title:
+            title = extract_title(detail_soup)
+
+        dep = extract_department(detail_soup) if detail_soup is not None else ""
+        return emails, title, dep
+    except Exception:
+        return None
+
+
+def store_profile(contacts_buf, profiles_buf, link, emails, title, dep):
+    """Vuelca en los buffers lo extraído de una ficha. Devuelve nº de emails reales."""
+    # emails en ficha
+    for e in emails:
+        upsert_contact(contacts_buf, {
+            "source_url": link,
+            "full_name": None,
+            "first_name": None,
+            "last_name": None,
+            "email_found": e,
+            "email_generated": None,
+            "method": "email_found_profile",
+            "confidence": 1.0,
+            "notes": "profile page"
+        })
+
+    fn_p, ln_p = split_first_last(title) if title else (None, None)
+
+    upsert_profile(
+        profiles_buf,
+        source_url=link,
+        full_name=title,
+        first_name=fn_p,
+        last_name=ln_p,
+        university="UC Berkeley",
+        department=dep or None
+    )
+
+    if fn_p and ln_p:
+        gen = generate_email(fn_p, ln_p)
+        upsert_contact(contacts_buf, {
+            "source_url": link,
+            "full_name": title,
+            "first_name": fn_p,
+            "last_name": ln_p,
+            "email_found": None,
+            "email_generated": gen,
+            "method": "profile_name_generated",
+            "confidence": 0.6 if gen else 0.3,
+            "notes": "name from profile"
+        })
+    return len(emails)
+
+
 # ---------------------------
 # Storage: SQLite + export
 # ---------------------------
+SECONDARY_INDEXES = {
+    "idx_email_found": "contacts(email_found)",
+    "idx_email_generated": "contacts(email_generated)",
+}
+
+
+@contextmanager
+def transaction(con):
+    """BEGIN IMMEDIATE ... COMMIT explícitos (la conexión va en modo autocommit)."""
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        yield con
+    except BaseException:
+        con.execute("ROLLBACK")
+        raise
+    con.execute("COMMIT")
+
+
 def init_db(path):
-    con = sqlite3.connect(path)
+    # isolation_level=None: sqlite3 no abre transacciones implícitas; las controla transaction()
+    con = sqlite3.connect(path, isolation_level=None)
     cur = con.cursor()
+    # WAL + synchronous=NORMAL: un fsync por checkpoint en vez de dos por commit
+    cur.executescript("""
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-65536;
+    PRAGMA mmap_size=268435456;
+    PRAGMA foreign_keys=OFF;
+    """)
     cur.execute("""
     CREATE TABLE IF NOT EXISTS contacts (
         id TEXT PRIMARY KEY,
@@ -270,8 +708,9 @@ def init_db(path):
         notes TEXT
     )
     """)
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_email_found ON contacts(email_found)")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_email_generated ON contacts(email_generated)")
+    # Los índices secundarios se crean al final de la carga (create_indexes)
+    for name in SECONDARY_INDEXES:
+        cur.execute(f"DROP INDEX IF EXISTS {name}")
 
     cur.execute("""
     CREATE TABLE IF NOT EXISTS profiles (
@@ -283,83 +722,148 @@ def init_db(path):
         department TEXT
     )
     """)
-    con.commit()
     return con
 
 
-def upsert_contact(con, rec):
+def create_indexes(con):
+    """Crea los índices secundarios tras la carga masiva y actualiza estadísticas."""
+    with transaction(con):
+        for name, ddl in SECONDARY_INDEXES.items():
+            con.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {ddl}")
+    # ANALYZE explícito: PRAGMA optimize solo analiza tablas cuyos índices ya se han usado
+    # en consultas de esta conexión, y los recién creados no se han usado todavía
+    con.execute("ANALYZE")
+
+
+CONTACT_COLS = ["id", "source_url", "full_name", "first_name", "last_name",
+                "email_found", "email_generated", "method", "confidence", "notes"]
+INSERT_CONTACT_SQL = """
+    INSERT OR IGNORE INTO contacts (id,source_url,full_name,first_name,last_name,
+                                    email_found,email_generated,method,confidence,notes)
+    VALUES (?,?,?,?,?,?,?,?,?,?)
+"""
+UPSERT_PROFILE_SQL = """
+    INSERT INTO profiles (source_url, full_name, first_name, last_name, university, department)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(source_url) DO UPDATE SET
+        full_name=COALESCE(excluded.full_name, profiles.full_name),
+        first_name=COALESCE(excluded.first_name, profiles.first_name),
+        last_name=COALESCE(excluded.last_name, profiles.last_name),
+        university=COALESCE(excluded.university, profiles.university),
+        department=COALESCE(excluded.department, profiles.department)
+"""
+
+
+class WriteBuffer:
+    """Acumula filas y las escribe con executemany en una sola transacción.
+    Con dedupe=True descarta las filas cuya key ya se encoló antes."""
+
+    def __init__(self, con, sql, batch_size=1000, dedupe=False):
+        self.con = con
+        self.sql = sql
+        self.batch_size = batch_size
+        self.rows = []
+        # claves ya encoladas/insertadas: los duplicados no llegan a SQLite
+        self.seen = set() if dedupe else None
+        # cursor de larga vida: mismo texto SQL => se reutiliza el statement cacheado
+        self.cur = con.cursor()
+
+    def append(self, vals, key=None):
+        if self.seen is not None and key is not None:
+            if key in self.seen:
+                return
+            self.seen.add(key)
+        self.rows.append(vals)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def write(self):
+        """Ejecuta las filas pendientes sin hacer commit (lo gestiona el llamador)."""
+        if self.rows:
+            self.cur.executemany(self.sql, self.rows)
+            self.rows.clear()
+
+    def flush(self):
+        flush_buffers(self.con, self)
+
+
+def flush_buffers(con, *buffers):
+    """Vuelca varios buffers en una única transacción (un solo commit/fsync)."""
+    if not any(buf.rows for buf in buffers):
+        return
+    with transaction(con):
+        for buf in buffers:
+            buf.write()
+
+
+def upsert_contact(buf, rec):
     key = "|".join([
         rec.get("source_url","") or "",
         rec.get("full_name","") or "",
         rec.get("email_found","") or "",
         rec.get("email_generated","") or "",
     ])
-    rid = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    rid = xxhash.xxh3_128_hexdigest(key.encode("utf-8"))
     rec["id"] = rid
-    cols = ["id","source_url","full_name","first_name","last_name",
-            "email_found","email_generated","method","confidence","notes"]
-    vals = [rec.get(c) for c in cols]
-    con.execute(f"""
-        INSERT INTO contacts ({",".join(cols)})
-        VALUES ({",".join(["?"]*len(cols))})
-        ON CONFLICT(id) DO NOTHING
-    """, vals)
-    con.commit()
-
-
-def upsert_profile(con, source_url, full_name=None, first_name=None, last_name=None,
+    buf.append(tuple(rec.get(c) for c in CONTACT_COLS), key=rid)
+
+
+def upsert_profile(buf, source_url, full_name=None, first_name=None, last_name=None,
                    university=None, department=None):
-    con.execute("""
-        INSERT INTO profiles (source_url, full_name, first_name, last_name, university, department)
-        VALUES (?, ?, ?, ?, ?, ?)
-        ON CONFLICT(source_url) DO UPDATE SET
-            full_name=COALESCE(excluded.full_name, profiles.full_name),
-            first_name=COALESCE(excluded.first_name, profiles.first_name),
-            last_name=COALESCE(excluded.last_name, profiles.last_name),
-            university=COALESCE(excluded.university, profiles.university),
-            department=COALESCE(excluded.department, profiles.department)
-    """, (source_url, full_name, first_name, last_name, university, department))
-    con.commit()
+    buf.append((source_url, full_name, first_name, last_name, university, department))
 
 
 def export_raw_csv(con, path_csv):
-    df = pd.read_sql_query("SELECT * FROM contacts", con)
-    df.to_csv(path_csv, index=False)
-    return df
+    """Vuelca contacts fila a fila desde el cursor (memoria O(1)). Devuelve nº de filas."""
+    cur = con.execute(f"SELECT {','.join(CONTACT_COLS)} FROM contacts")
+    rows = 0
+    with open(path_csv, "w", newline="", encoding="utf-8", buffering=1024 * 1024) as f:
+        w = csv.writer(f, lineterminator="\n")
+        w.writerow(CONTACT_COLS)
+        for row in cur:
+            w.writerow(row)
+            rows += 1
+    return rows
 
 
 def export_crm_csv(con, path_csv, default_university="UC Berkeley"):
-    df_c = pd.read_sql_query("SELECT * FROM contacts", con)
-    df_p = pd.read_sql_query("SELECT * FROM profiles", con)
+    # El join lo resuelve SQLite usando la PK de profiles(source_url)
+    df = pd.read_sql_query("""
+        SELECT c.source_url, c.full_name, c.first_name, c.last_name,
+               c.email_found, c.email_generated,
+               p.full_name AS prof_full_name, p.first_name AS prof_first_name,
+               p.last_name AS prof_last_name, p.university AS prof_university,
+               p.department AS prof_department
+        FROM contacts c LEFT JOIN profiles p ON p.source_url = c.source_url
+    """, con)
 
     # Preferimos email_found; si no, email_generated
-    df_c["Email"] = df_c["email_found"].fillna(df_c["email_generated"])
-
-    df = df_c.merge(df_p.add_prefix("prof_"), how="left",
-                    left_on="source_url", right_on="prof_source_url")
+    df["Email"] = df["email_found"].fillna(df["email_generated"])
 
     f_name = df["prof_first_name"].fillna(df["first_name"])
     l_name = df["prof_last_name"].fillna(df["last_name"])
     full = df["prof_full_name"].fillna(df["full_name"])
 
-    # Completar Nombre/Apellidos desde full_name si faltan
+    # Completar Nombre/Apellidos desde full_name si faltan (misma regla que split_first_last)
     mask_need = f_name.isna() & l_name.isna() & full.notna()
     if mask_need.any():
-        split_vals = full[mask_need].apply(lambda s: pd.Series(split_first_last(s)))
-        f_name.loc[mask_need] = split_vals[0]
-        l_name.loc[mask_need]  = split_vals[1]
+        parts = full[mask_need].str.split()
+        enough = parts.str.len() >= 2
+        f_name.loc[mask_need] = parts.str[0].where(enough)
+        l_name.loc[mask_need] = parts.str[-1].where(enough)
 
     uni = df["prof_university"].fillna(default_university)
     dept = df["prof_department"].fillna("")
 
-    def make_id(row):
-        key = (row.get("Email") or "").strip().lower()
-        if not key:
-            key = f"{(row.get('prof_full_name') or row.get('full_name') or '').strip()}|{row.get('source_url') or ''}"
-        return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+    # id estable: email normalizado o, si no hay, nombre|url
+    keys = df["Email"].fillna("").str.strip().str.lower()
+    fallback = (df["prof_full_name"].fillna(df["full_name"]).fillna("").str.strip()
+                + "|" + df["source_url"].fillna(""))
+    final_keys = keys.where(keys.str.len() > 0, fallback)
+    ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, k)) for k in final_keys]
 
     out = pd.DataFrame({
-        "id":        df.apply(make_id, axis=1),
+        "id":        ids,
         "Nombre":    f_name.fillna(""),
         "Apellidos": l_name.fillna(""),
         "Email":     df["Email"].fillna(""),
@@ -378,8 +882,9 @@ def export_crm_csv(con, path_csv, default_university="UC Berkeley"):
         "last_clicked_url": ""
     })
 
-    out["__k"] = out["Email"].where(out["Email"].str.len() > 0, out["id"])
-    out = out.sort_values(["__k"]).drop_duplicates("__k").drop(columns="__k")
+    # dedup por Email (o id si no hay email) conservando la primera aparición, sin ordenar
+    key = out["Email"].where(out["Email"].str.len() > 0, out["id"])
+    out = out.loc[~key.duplicated()].copy()
 
     out.to_csv(path_csv, index=False)
     return out
@@ -394,26 +899,32 @@ def main():
         raise SystemExit("La URL no pertenece a berkeley.edu")
 
     con = init_db(args.db)
-    driver = build_driver(headless=bool(args.headless))
+    contacts_buf = WriteBuffer(con, INSERT_CONTACT_SQL, dedupe=True)
+    # ids de ejecuciones anteriores: INSERT OR IGNORE los descartaría igualmente
+    contacts_buf.seen.update(r[0] for r in con.execute("SELECT id FROM contacts"))
+    profiles_buf = WriteBuffer(con, UPSERT_PROFILE_SQL)
+    workers = max(1, args.workers)
+    sess = build_session(pool_size=max(20, workers))
     try:
-        driver.get(args.url)
-        css_list = [s.strip() for s in args.card_css.split(",") if s.strip()]
-
-        print("[MAIN] Página cargada. Intento 'Load more'...")
-        click_load_more_until_end(
-            driver,
-            css_list=css_list,
-            max_clicks=args.max_clicks,
-            wait_after_click=args.wait_after_click
-        )
+        html = None
+        source_url = args.url
+        if args.list_mode in ("auto", "ajax"):
+            print("[MAIN] Cargando listado vía /views/ajax (sin navegador)...")
+            try:
+                html = load_list_via_views_ajax(sess, args.url, max_pages=args.max_clicks)
+            except (requests.RequestException, ValueError, KeyError) as e:
+                print(f"[AJAX] Falló la carga AJAX: {e}")
+            if html is None and args.list_mode == "ajax":
+                raise SystemExit("La página no expone una vista AJAX de Drupal utilizable")
+        if html is None:
+            print("[MAIN] Usando Selenium para el listado...")
+            html, source_url = load_list_with_selenium(args)
 
-        print("[MAIN] Extrayendo HTML final y parseando...")
-        html = driver.page_source
-        source_url = driver.current_url
+        list_emails, soup = scan_page(html, parse=True)
 
         # 1) Emails visibles en la lista
-        for e in extract_emails_from_html(html):
-            upsert_contact(con, {
+        for e in list_emails:
+            upsert_contact(contacts_buf, {
                 "source_url": source_url,
                 "full_name": None,
                 "first_name": None,
@@ -426,11 +937,11 @@ def main():
             })
 
         # 2) Nombres en la lista
-        names, soup = extract_names_from_list_html(html)
+        names = extract_names_from_list_html(soup)
         for full in names:
             fn, ln = split_first_last(full)
             gen = generate_email(fn, ln) if fn and ln else None
-            upsert_contact(con, {
+            upsert_contact(contacts_buf, {
                 "source_url": source_url,
                 "full_name": full,
                 "first_name": fn,
@@ -442,107 +953,68 @@ def main():
                 "notes": "name from list card"
             })
 
+        flush_buffers(con, contacts_buf, profiles_buf)
+
         # 3) Fichas personales
         profile_links = set()
         for a in soup.select(".view-content .views-row a[href]"):
             href = a.get("href")
             if not href or href.startswith("#"):
                 continue
-            abs_url = urljoin(source_url, href)
-            if "berkeley.edu" not in abs_url:
+            url = abs_url(source_url, href)
+            if "berkeley.edu" not in url:
                 continue
-            if is_profile_like(abs_url):
-                profile_links.add(abs_url)
+            if is_profile_like(url):
+                profile_links.add(url)
 
         print(f"[DETAIL] Fichas detectadas: {len(profile_links)}")
 
-        HEADERS = {"User-Agent": "SophIA-ResearchBot/1.0 (+contact: outreach@sophia.ai)"}
         visited = 0
         found_detail_emails = 0
 
-        for link in list(profile_links)[:args.max_profiles]:
-            try:
-                time.sleep(args.profile_delay)
-                r = requests.get(link, headers=HEADERS, timeout=12)
-                if r.status_code != 200:
+        links = list(profile_links)[:args.max_profiles]
+        # Descarga en hilos (I/O) y parseo en procesos (CPU): ambos se solapan
+        with ThreadPoolExecutor(max_workers=workers) as pool, \
+                ProcessPoolExecutor(max_workers=max(1, args.parse_workers), mp_context=PARSE_MP_CONTEXT) as parse_pool:
+            # como mucho una petición cada profile_delay seg al sitio, con independencia de workers
+            limiter = RateLimiter(args.profile_delay)
+            fetched = pool.map(lambda l: fetch_profile(sess, l, limiter=limiter), links)
+            parsing = []
+            for link, detail_html in fetched:
+                if detail_html is None:
                     continue
-                if "text/html" not in r.headers.get("Content-Type",""):
-                    continue
-                detail_html = r.text
                 visited += 1
+                parsing.append((link, parse_pool.submit(parse_profile_html, detail_html)))
 
-                # emails en ficha
-                emails = set(m.group(1).lower() for m in EMAIL_RE.finditer(detail_html))
-                for e in emails:
-                    upsert_contact(con, {
-                        "source_url": link,
-                        "full_name": None,
-                        "first_name": None,
-                        "last_name": None,
-                        "email_found": e,
-                        "email_generated": None,
-                        "method": "email_found_profile",
-                        "confidence": 1.0,
-                        "notes": "profile page"
-                    })
-                if emails:
-                    found_detail_emails += len(emails)
-
-                # nombre y departamento en ficha
-                detail_soup = BeautifulSoup(detail_html, "html.parser")
-                title = None
-                for sel in ["h1", "h2", ".page-title", ".node--title", "header h1", ".title"]:
-                    el = detail_soup.select_one(sel)
-                    if el:
-                        title = (el.get_text(" ", strip=True) or "").strip()
-                        if title:
-                            break
-                if not title:
-                    el = detail_soup.select_one('[itemscope][itemtype*="Person" i] [itemprop="name"]')
-                    if el:
-                        title = (el.get_text(" ", strip=True) or "").strip()
-
-                dep = extract_department(detail_soup)
-                fn_p, ln_p = split_first_last(title) if title else (None, None)
-
-                upsert_profile(
-                    con,
-                    source_url=link,
-                    full_name=title,
-                    first_name=fn_p,
-                    last_name=ln_p,
-                    university="UC Berkeley",
-                    department=dep or None
-                )
-
-                if fn_p and ln_p:
-                    gen = generate_email(fn_p, ln_p)
-                    upsert_contact(con, {
-                        "source_url": link,
-                        "full_name": title,
-                        "first_name": fn_p,
-                        "last_name": ln_p,
-                        "email_found": None,
-                        "email_generated": gen,
-                        "method": "profile_name_generated",
-                        "confidence": 0.6 if gen else 0.3,
-                        "notes": "name from profile"
-                    })
-
-            except Exception:
-                continue
+            for link, fut in parsing:
+                parsed = fut.result()
+                if parsed is None:
+                    continue
+                try:
+                    found_detail_emails += store_profile(contacts_buf, profiles_buf, link, *parsed)
+                except Exception:
+                    continue
 
         print(f"[DETAIL] Fichas visitadas: {visited} | Emails reales en fichas: {found_detail_emails}")
 
         # Export
-        df_raw = export_raw_csv(con, args.out_csv)
+        flush_buffers(con, contacts_buf, profiles_buf)
+        create_indexes(con)
+        n_raw = export_raw_csv(con, args.out_csv)
         crm_path = args.out_csv.replace(".csv", "_CRM.csv")
         df_crm = export_crm_csv(con, crm_path)
-        print(f"[OK] Saved RAW CSV: {args.out_csv} | Rows: {len(df_raw)}")
+        print(f"[OK] Saved RAW CSV: {args.out_csv} | Rows: {n_raw}")
         print(f"[OK] Saved CRM CSV: {crm_path} | Rows: {len(df_crm)}")
 
+    except BaseException:
+        # conservar lo ya scrapeado; si el volcado también falla, se avisa sin tapar el error original
+        try:
+            flush_buffers(con, contacts_buf, profiles_buf)
+        except Exception as e:
+            print(f"[WARN] No se pudieron guardar las filas pendientes: {e}")
+        raise
     finally:
-        driver.quit()
+        sess.close()
         con.close()
 
 
@@ -0,0 +1,72 @@
+"""
+Utilidades HTTP y de URLs compartidas por los scrapers scrape_uc3m_emails_v*.py
+(se importan como módulo hermano: `from _http import ...`).
+"""
+
+import threading
+import time
+from urllib.parse import urljoin
+
+MAX_PAGE_BYTES = 2 * 1024 * 1024  # tope de cuerpo por página
+
+
+# main.py (scraper de Berkeley) tiene una copia idéntica de RateLimiter y abs_url:
+# si se cambian aquí, cambiarlas también allí.
+class RateLimiter:
+    """Espaciado mínimo entre inicios de petición, compartido por todos los hilos."""
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        if self.min_interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.min_interval
+        time.sleep(start - now)
+
+
+def read_capped(resp, cap=MAX_PAGE_BYTES):
+    """Cuerpo de una respuesta pedida con stream=True, como mucho cap bytes.
+
+    Devuelve None (sin descargar) si Content-Length ya supera cap. Si el cuerpo
+    sigue más allá de cap se corta ahí; ambos casos se avisan por pantalla.
+    """
+    length = resp.headers.get("Content-Length", "")
+    if length.isdigit() and int(length) > cap:
+        print(f"[SKIP] {resp.url}: {length} bytes (máx. {cap})")
+        return None
+    chunks = []
+    total = 0
+    for chunk in resp.iter_content(64 * 1024):
+        chunks.append(chunk)
+        total += len(chunk)
+        if total > cap:
+            print(f"[WARN] {resp.url}: página truncada a {cap} bytes")
+            break
+    return b"".join(chunks)[:cap]
+
+
+def abs_url(base, href):
+    """urljoin solo para enlaces relativos: un href http(s) absoluto ya es la URL final."""
+    if href.startswith(("http://", "https://")):
+        return href
+    return urljoin(base, href)
+
+
+def in_domain(url, domain):
+    """urlparse(url).netloc == domain para URLs http(s), sin parsear la URL y sin
+    distinguir entre "uc3m.es" y "www.uc3m.es"."""
+    if domain.startswith("www."):
+        domain = domain[4:]
+    for scheme in ("https://", "http://"):
+        if url.startswith(scheme):
+            rest = url[len(scheme):]
+            if rest.startswith("www."):
+                rest = rest[4:]
+            return rest.startswith(domain) and rest[len(domain):len(domain) + 1] in ("", "/", "?", "#")
+    return False
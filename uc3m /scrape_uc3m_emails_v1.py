@@ -9,17 +9,23 @@ Salida:
 """
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
 import re
 import time
 import csv
 import argparse
 import os
+import multiprocessing
 import urllib.robotparser
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urljoin, urlsplit
 from collections import deque
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from tqdm import tqdm
 
+from _http import RateLimiter, read_capped
+
 BASE_DOMAIN = "uc3m.es"
 BASE_URL = "https://www.uc3m.es/"
 
@@ -27,42 +33,108 @@ HEADERS = {
     "User-Agent": "uc3m-scraper/1.0 (+https://github.com/tu-repo) - Contact: tu.email@example.com"
 }
 
+# una sola Session: reutiliza conexiones keep-alive (fetch() ya gestiona los reintentos)
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=32))
+SESSION.mount("http://", HTTPAdapter(pool_connections=32, pool_maxsize=32))
+
 EMAIL_REGEX = re.compile(r"[a-zA-Z0-9._%+\-]+@[a-zA-Z0-9.\-]+\.[a-zA-Z]{2,}")  # robust email regex
 
+# charset declarado en la cabecera Content-Type
+CHARSET_RE = re.compile(r'charset=["\']?([\w.:-]+)', re.I)
+
+# del HTML solo se usan los enlaces (los emails salen del texto crudo con la regex)
+ANCHOR_STRAINER = SoupStrainer("a", href=True)
+# enlaces que nunca son páginas a rastrear (se descartan antes de construir la URL)
+SKIP_HREF_PREFIXES = ("#", "javascript:", "tel:")
+
+# lxml + XPath para sacar los href sin construir el árbol de BeautifulSoup
+try:
+    from lxml import etree
+    LXML_PARSER = etree.HTMLParser()
+    HREFS_XPATH = etree.XPath("//a/@href", smart_strings=False)  # str planos, sin referencia al árbol
+except ImportError:
+    etree = None
+
+# peticiones simultáneas; el espaciado entre inicios lo marca RateLimiter
+WORKERS = 4
+
 OUT_DIR = os.getcwd()
 OUT_FILE = "profesores_uc3m_v1.csv"
 
-# robots.txt comprobar
+# robots.txt comprobar (se descarga con la Session y se parsea una sola vez)
+_ROBOTS = None
+_ROBOTS_LOADED = False
+_ROBOTS_DECISIONS = {}  # (user_agent, path, query) -> bool
+
+
+def get_robots():
+    global _ROBOTS, _ROBOTS_LOADED
+    if not _ROBOTS_LOADED:
+        _ROBOTS_LOADED = True
+        robots_url = urljoin(BASE_URL, "robots.txt")
+        rp = urllib.robotparser.RobotFileParser(robots_url)
+        try:
+            resp = SESSION.get(robots_url, timeout=15)
+            # misma semántica que RobotFileParser.read(): 401/403 prohíben todo,
+            # otro 4xx (p. ej. 404) lo permite todo y un 5xx es un error
+            if resp.status_code in (401, 403):
+                rp.disallow_all = True
+            elif 400 <= resp.status_code < 500:
+                rp.allow_all = True
+            else:
+                resp.raise_for_status()
+                rp.parse(resp.text.splitlines())
+            _ROBOTS = rp
+        except requests.RequestException as e:
+            # si no se puede leer robots.txt
+            print(f"[WARN] No se pudo leer robots.txt ({robots_url}): {e}. Procede con precaución.")
+    return _ROBOTS
+
+
 def allowed_by_robots(url, user_agent=HEADERS["User-Agent"]):
-    robots_url = urljoin(BASE_URL, "robots.txt")
-    rp = urllib.robotparser.RobotFileParser()
-    try:
-        rp.set_url(robots_url)
-        rp.read()
-    except Exception as e:
-        # si no se puede leer robots.txt
-        print(f"[WARN] No se pudo leer robots.txt ({robots_url}): {e}. Procede con precaución.")
+    rp = get_robots()
+    if rp is None:
         return False
-    return rp.can_fetch(user_agent, url)
+    # robots.txt solo mira ruta y query: URLs que difieren en host o #fragmento comparten decisión
+    parts = urlsplit(url)
+    key = (user_agent, parts.path, parts.query)
+    allowed = _ROBOTS_DECISIONS.get(key)
+    if allowed is None:
+        allowed = _ROBOTS_DECISIONS[key] = rp.can_fetch(user_agent, url)
+    return allowed
 
 
 def is_internal_url(url):
+    # comparación de sufijo sobre el host: "uc3m.es" o "*.uc3m.es" (sin puerto ni credenciales)
     try:
-        p = urlparse(urljoin(BASE_URL, url))
-        return p.netloc.endswith(BASE_DOMAIN)
-    except:
+        host = urlsplit(urljoin(BASE_URL, url)).hostname or ""
+    except ValueError:
         return False
+    return host == BASE_DOMAIN or host.endswith("." + BASE_DOMAIN)
 
+@lru_cache(maxsize=4096)  # los mismos enlaces de menú se repiten en cada página
 def normalize_url(url):
     return urljoin(BASE_URL, url)
 
 
 def fetch(url, timeout=15, max_retries=2):
+    """HTML de url como str (leído en streaming, hasta MAX_PAGE_BYTES) o None."""
     for attempt in range(max_retries + 1):
         try:
-            resp = requests.get(url, headers=HEADERS, timeout=timeout)
-            resp.raise_for_status()
-            return resp
+            with SESSION.get(url, timeout=timeout, stream=True) as resp:
+                resp.raise_for_status()
+                body = read_capped(resp)
+                if body is None:
+                    return None
+                # charset explícito: sin él habría que recurrir a la detección (lenta) de charset_normalizer
+                m = CHARSET_RE.search(resp.headers.get("Content-Type", ""))
+                encoding = m.group(1) if m else "utf-8"
+            try:
+                return body.decode(encoding, "replace")
+            except LookupError:  # charset desconocido en la cabecera
+                return body.decode("utf-8", "replace")
         except requests.RequestException as e:
             if attempt < max_retries:
                 time.sleep(1 + attempt*2)
@@ -73,78 +145,110 @@ def fetch(url, timeout=15, max_retries=2):
 # parse emails from HTML text
 def extract_emails(text):
     # extraer emails y normalizar (lower, únicos)
-    found = set(m.group(0).lower() for m in EMAIL_REGEX.finditer(text))
-    return found
+    return set(map(str.lower, EMAIL_REGEX.findall(text)))
 
-# main crawler (breadth-first, con límite)
-def crawl(start_urls, max_pages=1000, delay=0.7):
+def extract_hrefs(html):
+    """Valores href de los <a> de la página, en orden de documento."""
+    if etree is not None:
+        try:
+            root = etree.fromstring(html, LXML_PARSER)
+            return HREFS_XPATH(root) if root is not None else []
+        except (ValueError, etree.LxmlError):
+            pass  # p. ej. str con declaración <?xml encoding=...?>: BeautifulSoup lo acepta
+    soup = BeautifulSoup(html, "html.parser", parse_only=ANCHOR_STRAINER)
+    return [a["href"] for a in soup.find_all("a", href=True)]
+
+# el pool de procesos se crea con las descargas en curso: sin fork, que heredaría sus locks
+PARSE_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+
+def parse_page(html):
+    """(emails, hrefs) de una página. Función de módulo para poder ejecutarse en un ProcessPoolExecutor."""
+    return extract_emails(html), extract_hrefs(html)
+
+# main crawler (breadth-first por tandas de `workers` páginas descargadas en paralelo, con límite)
+def crawl(start_urls, max_pages=1000, delay=0.7, workers=WORKERS, parse_workers=None):
     os.makedirs(OUT_DIR, exist_ok=True)
+    # seen = URLs que ya entraron en la cola: cada una se encola una sola vez
     seen = set()
     q = deque()
     for u in start_urls:
-        q.append(normalize_url(u))
+        u = normalize_url(u)
+        if u not in seen:
+            seen.add(u)
+            q.append(u)
     emails_found = {}  # email -> set(urls)
     pages_scanned = 0
 
     pbar = tqdm(total=max_pages, desc="Pages")
 
-    while q and pages_scanned < max_pages:
-        url = q.popleft()
-        if url in seen:
-            continue
-        if not is_internal_url(url):
-            continue
-        # respetar robots
-        if not allowed_by_robots(url):
-            # si robots.txt prohíbe, saltar
-            print(f"[SKIP robots] {url}")
-            seen.add(url)
-            continue
-
-        resp = fetch(url)
-        seen.add(url)
-        pages_scanned += 1
-        pbar.update(1)
-
-        if resp is None:
-            continue
-
-        content_type = resp.headers.get("Content-Type","")
-        text = resp.text
-
-        # extraer emails de la página
-        emails = extract_emails(text)
-        for e in emails:
-            emails_found.setdefault(e, set()).add(url)
-
-        # parsear enlaces internos para seguir crawling
-        try:
-            soup = BeautifulSoup(text, "lxml")
-        except Exception:
-            soup = BeautifulSoup(text, "html.parser")
-
-        # extrae enlaces relevantes
-        for a in soup.find_all("a", href=True):
-            href = a["href"].strip()
-            # ignorar enlaces mailto (los podemos extraer con regex) o anchors
-            if href.startswith("mailto:"):
-                mail = href.split(":",1)[1]
-                if EMAIL_REGEX.search(mail):
-                    emails_found.setdefault(mail.lower(), set()).add(url)
-                continue
-            if href.startswith("#"):
-                continue
-            full = normalize_url(href)
-            if is_internal_url(full) and full not in seen:
-                # opcional: limitar a URLs que contienen /ListadoPersonalDept/ o 'personal' para priorizar listados
-                q.append(full)
-
-        time.sleep(delay)
+    # delay sigue siendo la separación mínima entre peticiones al sitio (todas las hebras)
+    limiter = RateLimiter(delay)
+
+    def fetch_limited(url):
+        limiter.wait()
+        return fetch(url)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool, \
+            ProcessPoolExecutor(max_workers=max(1, parse_workers or os.cpu_count() or 1),
+                                mp_context=PARSE_MP_CONTEXT) as parse_pool:
+        while q and pages_scanned < max_pages:
+            # siguiente tanda: hasta `workers` URLs válidas de la cola, en orden BFS
+            batch = []
+            while q and len(batch) < min(workers, max_pages - pages_scanned):
+                url = q.popleft()
+                if not is_internal_url(url):
+                    continue
+                # respetar robots
+                if not allowed_by_robots(url):
+                    # si robots.txt prohíbe, saltar
+                    print(f"[SKIP robots] {url}")
+                    continue
+                batch.append(url)
+
+            # cada página se parsea en otro proceso nada más llegar, mientras siguen
+            # llegando las demás descargas de la tanda
+            parsing = []
+            for url, html in zip(batch, pool.map(fetch_limited, batch)):
+                pages_scanned += 1
+                pbar.update(1)
+
+                if html is None:
+                    continue
+
+                parsing.append((url, parse_pool.submit(parse_page, html)))
+
+            # resultados en el orden de la cola (BFS estable)
+            for url, fut in parsing:
+                emails, hrefs = fut.result()
+
+                # emails de la página
+                for e in emails:
+                    emails_found.setdefault(e, set()).add(url)
+
+                # extrae enlaces relevantes para seguir crawling
+                for href in hrefs:
+                    href = href.strip()
+                    # ignorar enlaces mailto (los podemos extraer con regex) o anchors
+                    if href.startswith("mailto:"):
+                        mail = href.split(":",1)[1]
+                        if EMAIL_REGEX.search(mail):
+                            emails_found.setdefault(mail.lower(), set()).add(url)
+                        continue
+                    if href.startswith(SKIP_HREF_PREFIXES):
+                        continue
+                    # sin #fragmento: /p y /p#x son la misma página (se descargaría dos veces)
+                    full = normalize_url(href.split("#", 1)[0])
+                    if full not in seen and is_internal_url(full):
+                        # opcional: limitar a URLs que contienen /ListadoPersonalDept/ o 'personal' para priorizar listados
+                        seen.add(full)
+                        q.append(full)
 
     pbar.close()
 
     # guardar CSV
-    with open(OUT_FILE, "w", newline="", encoding="utf-8") as f:
+    with open(OUT_FILE, "w", newline="", encoding="utf-8", buffering=1024 * 1024) as f:
         w = csv.writer(f)
         w.writerow(["email", "found_on_urls"])
         for email, urls in sorted(emails_found.items()):
@@ -158,6 +262,8 @@ if __name__ == "__main__":
     parser.add_argument("--seed", type=str, help="archivo con URLs semilla (una por línea)")
     parser.add_argument("--max", type=int, default=200, help="max páginas a escanear")
     parser.add_argument("--delay", type=float, default=0.8, help="segundos de espera entre peticiones")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="descargas simultáneas")
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count() or 1, help="procesos para parsear páginas")
     args = parser.parse_args()
 
     if args.seed:
@@ -180,4 +286,5 @@ if __name__ == "__main__":
         print("[ERROR] robots.txt bloquea el scraping del dominio base. Revisa antes de continuar.")
         exit(1)
 
-    crawl(seeds, max_pages=args.max, delay=args.delay)
+    crawl(seeds, max_pages=args.max, delay=args.delay, workers=args.workers,
+          parse_workers=args.parse_workers)
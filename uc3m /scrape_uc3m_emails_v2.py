@@ -1,9 +1,16 @@
 #!/usr/bin/env python3
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, SoupStrainer
+import soupsieve as sv
 import csv, os, time, re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from urllib.parse import urljoin, urlparse
 
+from _http import RateLimiter
+
 BASE = "https://www.uc3m.es"
 DEPT_LIST_URL = "https://www.uc3m.es/conocenos/departamentos"
 DIRECTORIO_URL = "https://www.uc3m.es/directorio"
@@ -13,12 +20,85 @@ HEADERS = {
 }
 
 EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+WS_RE = re.compile(r'\s+')
+NAME_SANITIZE_RE = re.compile(r'[^\w\s\-.,]')
+# solo dígitos y separadores (.,-), con al menos un dígito: teléfonos, extensiones...
+DIGIT_ONLY_RE = re.compile(r'^[.,\-]*\d[\d.,\-]*$')
+
+# Selectores de "ficha de persona": compilados una vez y combinados en una sola consulta
+PROFILE_SELECTORS = [
+    "div.person", "div.profile", "div.staff-member", "div.contact",
+    "div[class*='person']", "div[class*='profile']", "div[class*='staff']",
+    "div[class*='member']", "div[class*='faculty']"
+]
+PROFILE_SEL = sv.compile(", ".join(PROFILE_SELECTORS))
+PROFILE_SEL_EACH = [sv.compile(sel) for sel in PROFILE_SELECTORS]
+
+
+# nombre de departamento -> clave compacta sin espacios, signos ni acentos (una sola pasada)
+DEPT_TRANS = str.maketrans({" ": "", ":": "", ",": "", "é": "e", "á": "a",
+                            "í": "i", "ó": "o", "ú": "u", "ñ": "n"})
+
+# palabras que delatan un enlace a la página de personal (en el texto o en el href)
+PERSONAL_KEYWORDS = ["personal", "profesorado", "profesor", "profesores",
+                     "titular", "asociado", "plantilla", "staff", "miembros",
+                     "listado", "directorio", "equipo"]
+
+
+def clean_name(name):
+    """Quita los caracteres que no pueden formar parte de un nombre y recorta."""
+    return NAME_SANITIZE_RE.sub('', name).strip()
+
+
+def profile_priority(elem):
+    """Índice del primer selector de PROFILE_SELECTORS que casa con elem."""
+    return next(i for i, sel in enumerate(PROFILE_SEL_EACH) if sel.match(elem))
+
+# lxml (C) si está instalado; html.parser como respaldo
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# el listado de departamentos solo necesita los enlaces
+ANCHOR_STRAINER = SoupStrainer("a", href=True)
+
+# Session compartida: keep-alive + pool de conexiones + reintentos con backoff.
+# Si requests-cache está instalado, las respuestas 200 se guardan en disco (uc3m_cache.sqlite)
+# durante un día y las re-ejecuciones no vuelven a descargar las mismas páginas.
+try:
+    import requests_cache
+    SESSION = requests_cache.CachedSession("uc3m_cache", backend="sqlite", expire_after=86400,
+                                           allowable_codes=(200,), cache_control=True)
+except ImportError:
+    SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32,
+                       max_retries=Retry(total=2, backoff_factor=0.5))
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+
+# páginas de personal descargadas en paralelo; el espaciado entre peticiones es global
+WORKERS = 8
+REQUEST_INTERVAL = 0.5  # seg entre inicios de petición (todas las hebras), como el sleep original
 
-def get_html(url):
+
+LIMITER = RateLimiter(REQUEST_INTERVAL)
+
+@lru_cache(maxsize=128)
+def fetch_bytes(url):
+    """HTML crudo de url. Cacheado: evita repetir descargas de URLs ya pedidas
+    (p. ej. enlaces de personal que aparecen en varios departamentos)."""
+    LIMITER.wait()
+    r = SESSION.get(url, timeout=15)
+    r.raise_for_status()
+    return r.content
+
+
+def get_html(url, parse_only=None):
     try:
-        r = requests.get(url, headers=HEADERS, timeout=15)
-        r.raise_for_status()
-        return BeautifulSoup(r.text, "html.parser")
+        return BeautifulSoup(fetch_bytes(url), HTML_PARSER, parse_only=parse_only)
     except Exception as e:
         print(f"[ERROR] No se pudo cargar {url}: {e}")
         return None
@@ -27,7 +107,7 @@ def get_html(url):
 # 1) Encontrar enlaces a departamentos
 def get_departments():
     print(f"[INFO] Cargando HTML desde {DEPT_LIST_URL}")
-    soup = get_html(DEPT_LIST_URL)
+    soup = get_html(DEPT_LIST_URL, parse_only=ANCHOR_STRAINER)
     if not soup:
         return []
 
@@ -64,42 +144,43 @@ def get_departments():
 # 2) Encontrar página de personal dentro de cada departamento
 
 def find_personal_pages(dept_url, dept_name):
-    """Busca páginas de personal usando múltiples estrategias"""
+    """Busca páginas de personal usando múltiples estrategias.
+    Devuelve (urls, soups): soups guarda las páginas ya parseadas para no repetirlas."""
     personal_urls = []
     visited = set()
+    soups = {}
     
     # Estrategia 1: Buscar enlaces en la página del departamento
     soup = get_html(dept_url)
     if soup:
+        # Una sola pasada por los enlaces. Los de la segunda categoría (internos largos
+        # con satellite/departamento) se añaden al final, en el mismo orden que antes.
+        extra_urls = []
         for a in soup.find_all("a", href=True):
+            href = a["href"]
+            href_l = href.lower()
             text = a.get_text(" ", strip=True).lower()
-            href = a.get("href", "").lower()
             
-            keywords = ["personal", "profesorado", "profesor", "profesores", 
-                       "titular", "asociado", "plantilla", "staff", "miembros",
-                       "listado", "directorio", "equipo"]
-            
-            if any(k in text or k in href for k in keywords):
-                full_url = urljoin(dept_url, a["href"])
+            if any(k in text or k in href_l for k in PERSONAL_KEYWORDS):
+                full_url = urljoin(dept_url, href)
                 if full_url.startswith(BASE) and full_url not in visited:
                     personal_urls.append(full_url)
                     visited.add(full_url)
+            # ("personal" y "listado" ya están en PERSONAL_KEYWORDS)
+            elif len(href) > 20 and ("satellite" in href_l or "departamento" in href_l):
+                # URLs largas suelen ser más específicas (evitar enlaces genéricos)
+                full_url = href if href.startswith(BASE) else urljoin(dept_url, href)
+                if full_url.startswith(BASE):
+                    extra_urls.append(full_url)
         
-        # También buscar todos los enlaces internos que puedan ser relevantes
-        for a in soup.find_all("a", href=True):
-            href = a.get("href", "")
-            full_url = urljoin(dept_url, href)
-            if (full_url.startswith(BASE) and 
-                full_url not in visited and
-                ("satellite" in href.lower() or "departamento" in href.lower() or 
-                 "personal" in href.lower() or "listado" in href.lower())):
-                # Verificar que no sea un enlace genérico
-                if len(href) > 20:  # URLs largas suelen ser más específicas
-                    personal_urls.append(full_url)
-                    visited.add(full_url)
+        # También los enlaces internos que puedan ser relevantes
+        for full_url in extra_urls:
+            if full_url not in visited:
+                personal_urls.append(full_url)
+                visited.add(full_url)
     
     # Estrategia 2: Intentar patrones conocidos de URL basados en el nombre del departamento
-    dept_short = dept_name.lower().replace(" ", "").replace(":", "").replace(",", "").replace("é", "e").replace("á", "a")
+    dept_short = dept_name.lower().translate(DEPT_TRANS)
     
     # Mapeo de nombres de departamentos a patrones conocidos
     dept_patterns = {
@@ -139,23 +220,31 @@ def find_personal_pages(dept_url, dept_name):
                 if any(k in text for k in ["profesor", "personal", "email", "@", "correo"]):
                     personal_urls.append(pattern_url)
                     visited.add(pattern_url)
-                    time.sleep(0.3)
+                    soups[pattern_url] = test_soup
     
     # Estrategia 3: Si no encontramos nada, usar la misma URL del departamento
     if not personal_urls:
         personal_urls.append(dept_url)
+        if soup:
+            soups[dept_url] = soup
     
-    return list(set(personal_urls))  # Eliminar duplicados
+    return personal_urls, soups  # urls ya sin duplicados (visited), en orden de descubrimiento
 
 # 3) Extraer nombres y correos de una página
-def extract_contacts_from_page(page_url, dept_name):
-    """Extrae nombres y correos de una página, intentando asociarlos"""
-    soup = get_html(page_url)
+def extract_contacts_from_page(page_url, dept_name, soup=None):
+    """Extrae nombres y correos de una página, intentando asociarlos.
+    Si se pasa soup (ya parseada) no se vuelve a descargar la página."""
+    if soup is None:
+        soup = get_html(page_url)
     if not soup:
         return []
+    # Texto de la página una sola vez: sirve para el filtro de '@' y para la búsqueda final.
+    # Sin '@' en el texto ninguna estrategia puede encontrar emails: no recorrer el DOM
+    page_text = soup.get_text(" ")
+    if "@" not in page_text:
+        return []
     
     results = []
-    raw_text = soup.get_text(" ")
     
     # Buscar tablas con información de personal
     tables = soup.find_all("table")
@@ -164,38 +253,40 @@ def extract_contacts_from_page(page_url, dept_name):
         for row in rows:
             cells = row.find_all(["td", "th"])
             if len(cells) >= 2:
-                text_content = " ".join([cell.get_text(" ", strip=True) for cell in cells])
-                emails = EMAIL_RE.findall(text_content)
+                # texto de cada celda una sola vez por fila
+                cell_texts = [cell.get_text(" ", strip=True) for cell in cells]
+                cell_texts_lower = [t.lower() for t in cell_texts]
+                text_content = " ".join(cell_texts)
                 
                 # Intentar extraer nombre (generalmente está antes del email)
-                for email in emails:
+                for m in EMAIL_RE.finditer(text_content):
+                    email = m.group(0)
                     name = ""
-                    for cell in cells:
-                        cell_text = cell.get_text(" ", strip=True)
-                        if email.lower() in cell_text.lower():
+                    email_lower = email.lower()
+                    for cell_idx, cell_text in enumerate(cell_texts):
+                        if email_lower in cell_texts_lower[cell_idx]:
                             # El nombre podría estar en la misma celda o en una anterior
-                            parts = cell_text.split(email)
-                            if parts[0].strip():
-                                name = parts[0].strip()
-                            else:
+                            pos = cell_text.find(email)
+                            before = (cell_text[:pos] if pos >= 0 else cell_text).strip()
+                            if before:
+                                name = before
+                            elif cell_idx > 0:
                                 # Buscar en celdas anteriores
-                                cell_idx = cells.index(cell)
-                                if cell_idx > 0:
-                                    name = cells[cell_idx - 1].get_text(" ", strip=True)
+                                name = cell_texts[cell_idx - 1]
                             break
                     
                     if not name:
                         # Si no encontramos nombre, usar texto antes del email
-                        email_idx = text_content.lower().find(email.lower())
+                        email_idx = m.start()
                         if email_idx > 0:
                             name = text_content[:email_idx].strip()
                             # Limpiar el nombre
-                            name = re.sub(r'\s+', ' ', name)
+                            name = WS_RE.sub(' ', name)
                             name = name.split('\n')[0].strip()
                     
                     # Limpiar nombre
                     if name:
-                        name = re.sub(r'[^\w\s\-.,]', '', name).strip()
+                        name = clean_name(name)
                         if len(name) > 2 and len(name) < 100:
                             results.append({
                                 "nombre": name,
@@ -210,14 +301,14 @@ def extract_contacts_from_page(page_url, dept_name):
             items = list_elem.find_all("li")
             for item in items:
                 item_text = item.get_text(" ", strip=True)
-                emails = EMAIL_RE.findall(item_text)
-                for email in emails:
+                for m in EMAIL_RE.finditer(item_text):
+                    email = m.group(0)
                     # Buscar nombre en el mismo item
-                    email_pos = item_text.lower().find(email.lower())
+                    email_pos = m.start()
                     if email_pos > 0:
                         name_part = item_text[:email_pos].strip()
                         # Limpiar
-                        name_part = re.sub(r'[^\w\s\-.,]', '', name_part).strip()
+                        name_part = clean_name(name_part)
                         if 2 < len(name_part) < 100 and '@' not in name_part:
                             results.append({
                                 "nombre": name_part,
@@ -225,57 +316,46 @@ def extract_contacts_from_page(page_url, dept_name):
                                 "departamento": dept_name,
                             })
     
-    # Buscar en divs con clases comunes de perfiles
-    profile_selectors = [
-        "div.person", "div.profile", "div.staff-member", "div.contact",
-        "div[class*='person']", "div[class*='profile']", "div[class*='staff']",
-        "div[class*='member']", "div[class*='faculty']"
-    ]
-    
-    for selector in profile_selectors:
-        try:
-            elements = soup.select(selector)
-            for elem in elements:
-                elem_text = elem.get_text(" ", strip=True)
-                emails = EMAIL_RE.findall(elem_text)
-                for email in emails:
-                    # Buscar nombre (generalmente en h2, h3, h4, o strong dentro del elemento)
-                    name = ""
-                    for tag in elem.find_all(["h1", "h2", "h3", "h4", "h5", "strong", "b"]):
-                        tag_text = tag.get_text(" ", strip=True)
-                        if '@' not in tag_text and 2 < len(tag_text) < 100:
-                            name = tag_text
-                            break
-                    
-                    if not name:
-                        # Buscar texto antes del email
-                        email_pos = elem_text.lower().find(email.lower())
-                        if email_pos > 0:
-                            name = elem_text[:email_pos].strip()
-                            name = re.sub(r'[^\w\s\-.,]', '', name).strip()
-                            # Tomar las últimas palabras
-                            words = name.split()
-                            if len(words) > 4:
-                                name = " ".join(words[-4:])
-                    
-                    if name and 2 < len(name) < 100:
-                        results.append({
-                            "nombre": name,
-                            "correo": email.lower(),
-                            "departamento": dept_name,
-                        })
-        except:
-            continue
+    # Buscar en divs con clases comunes de perfiles: un solo recorrido del DOM,
+    # procesando los elementos en el orden de prioridad de PROFILE_SELECTORS
+    for elem in sorted(PROFILE_SEL.select(soup), key=profile_priority):
+        elem_text = elem.get_text(" ", strip=True)
+        for m in EMAIL_RE.finditer(elem_text):
+            email = m.group(0)
+            # Buscar nombre (generalmente en h2, h3, h4, o strong dentro del elemento)
+            name = ""
+            for tag in elem.find_all(["h1", "h2", "h3", "h4", "h5", "strong", "b"]):
+                tag_text = tag.get_text(" ", strip=True)
+                if '@' not in tag_text and 2 < len(tag_text) < 100:
+                    name = tag_text
+                    break
+            
+            if not name:
+                # Buscar texto antes del email
+                email_pos = m.start()
+                if email_pos > 0:
+                    name = elem_text[:email_pos].strip()
+                    name = clean_name(name)
+                    # Tomar las últimas palabras
+                    words = name.split()
+                    if len(words) > 4:
+                        name = " ".join(words[-4:])
+            
+            if name and 2 < len(name) < 100:
+                results.append({
+                    "nombre": name,
+                    "correo": email.lower(),
+                    "departamento": dept_name,
+                })
     
     # Si aún no encontramos suficientes, buscar en todo el texto
     if not results:
-        all_text = soup.get_text(" ")
-        emails = EMAIL_RE.findall(all_text)
+        all_text = page_text
         
-        for email in emails:
-            email_lower = email.lower()
-            text_lower = all_text.lower()
-            email_pos = text_lower.find(email_lower)
+        # finditer da cada email junto con su posición: sin búsquedas ni lower() extra
+        for m in EMAIL_RE.finditer(all_text):
+            email = m.group(0)
+            email_pos = m.start()
             
             if email_pos > 0:
                 # Buscar nombre antes del email (hasta 300 caracteres antes)
@@ -288,21 +368,21 @@ def extract_contacts_from_page(page_url, dept_name):
                     if line and 2 < len(line) < 100:
                         # Verificar si parece un nombre
                         if ('@' not in line and 
-                            not line.replace('.', '').replace(',', '').replace('-', '').isdigit() and
+                            not DIGIT_ONLY_RE.match(line) and
                             not line.lower().startswith(('email', 'correo', 'tel', 'phone', 'fax'))):
-                            name = re.sub(r'[^\w\s\-.,]', '', line).strip()
+                            name = clean_name(line)
                             if 2 < len(name) < 100:
                                 break
                 
                 if not name:
                     # Extraer texto justo antes del email
                     before_email = context_before[-80:].strip()
-                    before_email = re.sub(r'\s+', ' ', before_email)
+                    before_email = WS_RE.sub(' ', before_email)
                     parts = before_email.split()
                     if parts:
                         # Tomar las últimas 2-4 palabras como posible nombre
                         name = " ".join(parts[-4:]) if len(parts) >= 4 else " ".join(parts)
-                        name = re.sub(r'[^\w\s\-.,]', '', name).strip()
+                        name = clean_name(name)
                 
                 if name and 2 < len(name) < 100:
                     results.append({
@@ -330,7 +410,7 @@ def extract_from_directorio():
     
     soup = get_html(DIRECTORIO_URL)
     if soup:
-        contacts = extract_contacts_from_page(DIRECTORIO_URL, "Varios")
+        contacts = extract_contacts_from_page(DIRECTORIO_URL, "Varios", soup)
         results.extend(contacts)
         print(f"  [DIRECTORIO] Encontrados {len(contacts)} contactos")
     
@@ -347,59 +427,58 @@ def main():
         print("[ERROR] No se encontraron departamentos")
         return
     
-    all_contacts = {}  # email -> contacto (para evitar duplicados)
-    
-    print(f"\n[INFO] Procesando {len(departamentos)} departamentos...\n")
-    
-    for dept_url, dept_name in departamentos:
-        print(f"\n[DEPARTAMENTO] {dept_name}")
-        print(f"  URL: {dept_url}")
-        
-        # Buscar páginas de personal
-        personal_pages = find_personal_pages(dept_url, dept_name)
-        print(f"  Páginas de personal encontradas: {len(personal_pages)}")
-        
-        for personal_url in personal_pages:
-            print(f"    Procesando: {personal_url[:80]}...")
-            contacts = extract_contacts_from_page(personal_url, dept_name)
-            
-            for contact in contacts:
-                email = contact["correo"]
-                # Si ya existe, actualizar si el nuevo tiene más información
-                if email not in all_contacts:
-                    all_contacts[email] = contact
-                elif not all_contacts[email]["nombre"] and contact["nombre"]:
-                    all_contacts[email] = contact
-            
-            print(f"    Contactos encontrados: {len(contacts)}")
-            time.sleep(0.5)  # Respetar el servidor
-    
-    # También buscar en el directorio general
-    directorio_contacts = extract_from_directorio()
-    for contact in directorio_contacts:
-        email = contact["correo"]
-        if email not in all_contacts:
-            all_contacts[email] = contact
-    
-    # Guardar CSV
+    # Los contactos se escriben al CSV según aparecen; solo se guardan los emails vistos.
+    # (extract_contacts_from_page solo devuelve contactos con nombre, así que el primero
+    # que aparece para cada email es el definitivo.)
+    seen_emails = set()
+    with_names = 0
     out = "profesores_uc3m_v2.csv"
+    
     with open(out, "w", newline="", encoding="utf-8") as f:
         writer = csv.DictWriter(
             f,
             fieldnames=["nombre", "correo", "departamento"]
         )
         writer.writeheader()
-        for contact in sorted(all_contacts.values(), key=lambda x: x["correo"]):
-            writer.writerow(contact)
+        
+        def write_new(contacts):
+            nonlocal with_names
+            for contact in contacts:
+                email = contact["correo"]
+                if email in seen_emails:
+                    continue
+                seen_emails.add(email)
+                writer.writerow(contact)
+                if contact["nombre"]:
+                    with_names += 1
+        
+        print(f"\n[INFO] Procesando {len(departamentos)} departamentos...\n")
+        
+        for dept_url, dept_name in departamentos:
+            print(f"\n[DEPARTAMENTO] {dept_name}")
+            print(f"  URL: {dept_url}")
+            
+            # Buscar páginas de personal
+            personal_pages, soups = find_personal_pages(dept_url, dept_name)
+            print(f"  Páginas de personal encontradas: {len(personal_pages)}")
+            
+            with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+                results = pool.map(lambda u: extract_contacts_from_page(u, dept_name, soups.get(u)), personal_pages)
+                for personal_url, contacts in zip(personal_pages, results):
+                    print(f"    Procesando: {personal_url[:80]}...")
+                    write_new(contacts)
+                    print(f"    Contactos encontrados: {len(contacts)}")
+        
+        # También buscar en el directorio general
+        write_new(extract_from_directorio())
     
-    print(f"\n[FIN] Total contactos únicos: {len(all_contacts)}")
+    print(f"\n[FIN] Total contactos únicos: {len(seen_emails)}")
     print(f"[CSV] Guardado en: {out}")
     
     # Estadísticas
-    with_names = sum(1 for c in all_contacts.values() if c["nombre"])
     print(f"[ESTADÍSTICAS]")
     print(f"  - Con nombre: {with_names}")
-    print(f"  - Sin nombre: {len(all_contacts) - with_names}")
+    print(f"  - Sin nombre: {len(seen_emails) - with_names}")
 
 if __name__ == "__main__":
     main()
@@ -1,17 +1,50 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, SoupStrainer
 import re
-import time
 import csv
 from urllib.parse import urljoin, urlparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-BASE_URL = "https://www.uc3m.es"
+from _http import RateLimiter, abs_url, in_domain, read_capped
 
-def get_soup(url):
+BASE_URL = "https://www.uc3m.es"
+DEPT_WORKERS = 6  # departamentos procesados a la vez
+REQUEST_INTERVAL = 0.5  # seg mínimos entre peticiones, sumando todos los hilos
+MAX_NAME_DEPTH = 8  # niveles de padres a inspeccionar buscando un nombre
+EMAIL_RE = re.compile(r"[a-zA-Z0-9._%+-]+@(?:[a-zA-Z0-9.-]+\.)+[a-zA-Z]{2,}")
+
+# lxml (C) si está instalado; html.parser como respaldo
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# el listado de departamentos solo necesita los enlaces
+ANCHOR_STRAINER = SoupStrainer("a", href=True)
+
+# Session compartida por todos los hilos: keep-alive + pool de conexiones + reintentos
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64,
+                       max_retries=Retry(total=2, backoff_factor=0.3))
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+
+# un único limitador para todos los departamentos: el ritmo al sitio no crece con DEPT_WORKERS
+LIMITER = RateLimiter(REQUEST_INTERVAL)
+
+def get_soup(url, parse_only=None):
+    LIMITER.wait()
     try:
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        return BeautifulSoup(r.text, "html.parser")
+        with SESSION.get(url, timeout=10, stream=True) as r:
+            r.raise_for_status()
+            body = read_capped(r)
+        if body is None:
+            return None
+        return BeautifulSoup(body, HTML_PARSER, parse_only=parse_only)
     except Exception as e:
         print(f"[ERROR] No se pudo acceder a {url}: {e}")
         return None
@@ -20,32 +53,34 @@ def get_soup(url):
 def extract_emails(text):
     if not text:
         return []
-    pattern = r"[a-zA-Z0-9._%+-]+@(?:[a-zA-Z0-9.-]+\.)+[a-zA-Z]{2,}"
-    return re.findall(pattern, text)
+    return EMAIL_RE.findall(text)
 
 
 def extract_name_from_node(node, email):
     """Intenta obtener el nombre desde el nodo o padres cercanos."""
-    if node is None:
-        return None
+    # Subir por los padres como mucho MAX_NAME_DEPTH niveles
+    for _ in range(MAX_NAME_DEPTH):
+        if node is None:
+            return None
 
-    # Texto sin el email
-    text = node.get_text(separator=" ", strip=True)
-    text = text.replace(email, "").strip()
+        # Texto sin el email
+        text = node.get_text(separator=" ", strip=True)
+        text = text.replace(email, "").strip()
 
-    # Heurísticas: evitar textos demasiado largos o irrelevantes
-    if 2 < len(text.split()) <= 8:
-        return text
+        # Heurísticas: evitar textos demasiado largos o irrelevantes
+        if 2 < len(text.split()) <= 8:
+            return text
 
-    # Subir al padre y reintentar
-    return extract_name_from_node(node.parent, email)
+        # Subir al padre y reintentar
+        node = node.parent
+    return None
 
 
 # 1. Obtener lista de departamentos
 
 def obtener_departamentos():
     url = "https://www.uc3m.es/conocenos/departamentos"
-    soup = get_soup(url)
+    soup = get_soup(url, parse_only=ANCHOR_STRAINER)
     if not soup:
         return []
 
@@ -55,7 +90,7 @@ def obtener_departamentos():
         if "/Detalle/Organismo_C" in a["href"]:
             departamentos.append(urljoin(BASE_URL, a["href"]))
 
-    return list(set(departamentos))
+    return list(dict.fromkeys(departamentos))
 
 
 
@@ -94,32 +129,42 @@ def crawl_personal(start_url, departamento, max_pages=40):
         return []
 
     visited = set()
-    to_visit = [start_url]
+    # cola FIFO + conjunto de encolados: cada URL entra una sola vez en la frontera
+    to_visit = deque([start_url])
+    queued = {start_url}
     domain = urlparse(start_url).netloc
 
     resultados = []
+    emails_vistos = set()  # emails ya en resultados (búsqueda O(1))
 
     while to_visit and len(visited) < max_pages:
-        url = to_visit.pop(0)
-        if url in visited:
-            continue
+        url = to_visit.popleft()
         visited.add(url)
 
         soup = get_soup(url)
         if not soup:
             continue
 
-        # Buscar correos en nodos con nombres cercanos
+        # Buscar correos en nodos con nombres cercanos; en la misma pasada,
+        # añadir los enlaces internos a la frontera
         for a in soup.find_all("a", href=True):
-            if a["href"].startswith("mailto:"):
-                email = a["href"].replace("mailto:", "").strip()
+            href = a["href"]
+            if href.startswith("mailto:"):
+                email = href.replace("mailto:", "").strip()
                 name = extract_name_from_node(a, email)
                 resultados.append((departamento, name, email))
+                emails_vistos.add(email)
+                continue
+            new_url = abs_url(url, href)
+            if new_url not in queued and in_domain(new_url, domain):
+                queued.add(new_url)
+                to_visit.append(new_url)
 
         # También buscar correos en texto
-        text_emails = extract_emails(soup.get_text())
+        page_text = soup.get_text()
+        text_emails = extract_emails(page_text) if "@" in page_text else []
         for email in text_emails:
-            if not any(email == r[2] for r in resultados):
+            if email not in emails_vistos:
                 # Intentar localizar el nodo contenedor
                 node = soup.find(string=lambda t: email in t)
                 if node:
@@ -128,15 +173,7 @@ def crawl_personal(start_url, departamento, max_pages=40):
                     name = None
 
                 resultados.append((departamento, name, email))
-
-        # Añadir enlaces internos
-        for a in soup.find_all("a", href=True):
-            new_url = urljoin(url, a["href"])
-            if urlparse(new_url).netloc == domain:
-                if new_url not in visited:
-                    to_visit.append(new_url)
-
-        time.sleep(0.5)
+                emails_vistos.add(email)
 
     return resultados
 
@@ -145,37 +182,47 @@ def crawl_personal(start_url, departamento, max_pages=40):
 # 4. Guardar CSV
 
 def guardar_csv(data, filename="profesores_uc3m_v3.csv"):
-    with open(filename, "w", newline="", encoding="utf-8") as f:
+    with open(filename, "w", newline="", encoding="utf-8", buffering=1024 * 1024) as f:
         writer = csv.writer(f)
         writer.writerow(["departamento", "profesor", "email"])
         writer.writerows(data)
 
 
 
-def main():
-    departamentos = obtener_departamentos()
-    print(f"Encontrados {len(departamentos)} departamentos.")
+def procesar_departamento(dep_url):
+    """Email y web del departamento + crawl de su personal. Devuelve (email, web, filas)."""
+    email_dep, web_dep = info_departamento(dep_url)
 
-    datos_finales = []
+    # Extraer nombre del departamento (último fragmento de la URL)
+    nombre_departamento = dep_url.split("/")[-2]
 
-    for dep_url in departamentos:
-        print("\n====================================================")
-        print("Procesando departamento:", dep_url)
+    filas = []
+    # Registrar email del departamento
+    if email_dep:
+        filas.append((nombre_departamento, "Departamento", email_dep))
 
-        email_dep, web_dep = info_departamento(dep_url)
-        print("Email dep:", email_dep, " | Web:", web_dep)
+    # Scraping del personal
+    if web_dep:
+        filas.extend(crawl_personal(web_dep, nombre_departamento))
 
-        # Extraer nombre del departamento (último fragmento de la URL)
-        nombre_departamento = dep_url.split("/")[-2]
+    return email_dep, web_dep, filas
 
-        # Registrar email del departamento
-        if email_dep:
-            datos_finales.append((nombre_departamento, "Departamento", email_dep))
 
-        # Scraping del personal
-        if web_dep:
-            data_personal = crawl_personal(web_dep, nombre_departamento)
-            datos_finales.extend(data_personal)
+def main():
+    departamentos = obtener_departamentos()
+    print(f"Encontrados {len(departamentos)} departamentos.")
+
+    datos_finales = []
+
+    # Los departamentos son independientes: se procesan en paralelo (IO-bound)
+    # y los resultados se recogen en el orden original
+    with ThreadPoolExecutor(max_workers=DEPT_WORKERS) as pool:
+        for dep_url, (email_dep, web_dep, filas) in zip(
+                departamentos, pool.map(procesar_departamento, departamentos)):
+            print("\n====================================================")
+            print("Procesando departamento:", dep_url)
+            print("Email dep:", email_dep, " | Web:", web_dep)
+            datos_finales.extend(filas)
 
     # Guardar CSV
     guardar_csv(datos_finales)
@@ -5,12 +5,15 @@ Versión 4: Extracción optimizada con limpieza en tiempo real
 """
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
 import re
 import time
 import csv
 from urllib.parse import urljoin, urlparse
-from collections import defaultdict
+from collections import defaultdict, deque
+
+from _http import abs_url, in_domain, read_capped
 
 BASE_URL = "https://www.uc3m.es"
 
@@ -21,15 +24,37 @@ HEADERS = {
 
 # Regex para emails válidos
 EMAIL_PATTERN = re.compile(r"[a-zA-Z0-9._%+-]+@(?:[a-zA-Z0-9.-]+\.)+[a-zA-Z]{2,}")
+WS_RE = re.compile(r'\s+')
+MAX_NAME_DEPTH = 8  # niveles de padres a inspeccionar buscando un nombre
+
+# lxml (C) si está instalado; html.parser como respaldo
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# el listado de departamentos solo necesita los enlaces
+ANCHOR_STRAINER = SoupStrainer("a", href=True)
+
+# una sola Session: reutiliza conexiones keep-alive (get_soup ya gestiona los reintentos)
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
 
 
-def get_soup(url, retries=2):
-    """Obtiene el soup de una URL con reintentos"""
+def get_soup(url, retries=2, parse_only=None):
+    """Obtiene el soup de una URL con reintentos (cuerpo leído en streaming, hasta MAX_PAGE_BYTES)"""
     for attempt in range(retries):
         try:
-            r = requests.get(url, headers=HEADERS, timeout=15)
-            r.raise_for_status()
-            return BeautifulSoup(r.text, "html.parser")
+            with SESSION.get(url, timeout=15, stream=True) as r:
+                r.raise_for_status()
+                body = read_capped(r)
+            if body is None:
+                return None
+            return BeautifulSoup(body, HTML_PARSER, parse_only=parse_only)
         except Exception as e:
             if attempt < retries - 1:
                 time.sleep(1)
@@ -39,6 +64,17 @@ def get_soup(url, retries=2):
     return None
 
 
+# palabras que delatan un enlace a páginas de personal
+LINK_KEYWORDS = ["personal", "profesor", "profesores", "plantilla", "staff",
+                 "miembros", "equipo", "directorio", "listado"]
+
+
+def is_personal_link(a, href):
+    text = a.get_text(strip=True).lower()
+    href_l = href.lower()
+    return any(kw in text or kw in href_l for kw in LINK_KEYWORDS)
+
+
 def clean_email(email_text):
     """Limpia y normaliza un email en el momento de extracción"""
     if not email_text:
@@ -51,8 +87,10 @@ def clean_email(email_text):
     
     email = match.group(0)
     
-    # Limpiar: quitar puntos finales, espacios, y convertir a minúsculas
-    email = email.rstrip('. ').lower().strip()
+    # Limpiar: quitar puntos finales, espacios, y convertir a minúsculas (si hace falta)
+    email = email.rstrip('. ').strip()
+    if not email.islower():
+        email = email.lower()
     
     # Validar que sea un email de UC3M o dominio relacionado
     if '@uc3m.es' in email or '@pa.uc3m.es' in email:
@@ -73,7 +111,7 @@ def normalize_name(name):
         return None
     
     # Limpiar espacios múltiples
-    name = re.sub(r'\s+', ' ', name)
+    name = WS_RE.sub(' ', name)
     
     # Validar longitud y número de palabras
     words = name.split()
@@ -91,76 +129,79 @@ def normalize_name(name):
 
 def extract_name_advanced(node, email):
     """Extrae el nombre usando múltiples estrategias avanzadas"""
-    if node is None:
-        return None
-    
-    # Estrategia 1: Buscar en el mismo nodo y hermanos
-    for candidate in [node, node.previous_sibling, node.next_sibling]:
-        if candidate and hasattr(candidate, 'get_text'):
-            text = candidate.get_text(separator=" ", strip=True)
-            text = text.replace(email, "").strip()
-            name = normalize_name(text)
-            if name:
-                return name
-    
-    # Estrategia 2: Buscar en el padre y sus hermanos
-    parent = node.parent
-    if parent:
-        # Buscar en elementos hermanos del padre
-        for sibling in [parent.previous_sibling, parent.next_sibling]:
-            if sibling and hasattr(sibling, 'get_text'):
-                text = sibling.get_text(separator=" ", strip=True)
+    # Iterativo (antes recursivo): como mucho MAX_NAME_DEPTH niveles hacia arriba
+    for _ in range(MAX_NAME_DEPTH):
+        if node is None:
+            return None
+        
+        # Estrategia 1: Buscar en el mismo nodo y hermanos
+        for candidate in [node, node.previous_sibling, node.next_sibling]:
+            if candidate and hasattr(candidate, 'get_text'):
+                text = candidate.get_text(separator=" ", strip=True)
                 text = text.replace(email, "").strip()
                 name = normalize_name(text)
                 if name:
                     return name
-        
-        # Buscar en el texto del padre
-        text = parent.get_text(separator=" ", strip=True)
-        text = text.replace(email, "").strip()
-        name = normalize_name(text)
-        if name:
-            return name
-    
-    # Estrategia 3: Buscar en estructuras comunes (tablas, listas)
-    # Buscar en la fila de tabla (td o th)
-    if parent and parent.name in ['td', 'th']:
-        row = parent.find_parent('tr')
-        if row:
-            cells = row.find_all(['td', 'th'])
-            for cell in cells:
-                text = cell.get_text(separator=" ", strip=True)
-                if email not in text:  # No debe contener el email
+    
+        # Estrategia 2: Buscar en el padre y sus hermanos
+        parent = node.parent
+        if parent:
+            # Buscar en elementos hermanos del padre
+            for sibling in [parent.previous_sibling, parent.next_sibling]:
+                if sibling and hasattr(sibling, 'get_text'):
+                    text = sibling.get_text(separator=" ", strip=True)
+                    text = text.replace(email, "").strip()
                     name = normalize_name(text)
                     if name:
                         return name
+        
+            # Buscar en el texto del padre
+            text = parent.get_text(separator=" ", strip=True)
+            text = text.replace(email, "").strip()
+            name = normalize_name(text)
+            if name:
+                return name
     
-    # Estrategia 4: Buscar en elementos li (listas)
-    if parent and parent.name == 'li':
-        text = parent.get_text(separator=" ", strip=True)
-        text = text.replace(email, "").strip()
-        name = normalize_name(text)
-        if name:
-            return name
-    
-    # Estrategia 5: Buscar en divs con clases comunes
-    container = node.find_parent(['div', 'span', 'p'])
-    if container:
-        # Buscar texto antes del email en el mismo contenedor
-        full_text = container.get_text(separator=" ", strip=True)
-        email_pos = full_text.find(email)
-        if email_pos > 0:
-            before_email = full_text[:email_pos].strip()
-            # Tomar las últimas 2-4 palabras antes del email
-            words = before_email.split()[-4:]
-            if len(words) >= 2:
-                name = normalize_name(" ".join(words))
-                if name:
-                    return name
+        # Estrategia 3: Buscar en estructuras comunes (tablas, listas)
+        # Buscar en la fila de tabla (td o th)
+        if parent and parent.name in ['td', 'th']:
+            row = parent.find_parent('tr')
+            if row:
+                cells = row.find_all(['td', 'th'])
+                for cell in cells:
+                    text = cell.get_text(separator=" ", strip=True)
+                    if email not in text:  # No debe contener el email
+                        name = normalize_name(text)
+                        if name:
+                            return name
+    
+        # Estrategia 4: Buscar en elementos li (listas)
+        if parent and parent.name == 'li':
+            text = parent.get_text(separator=" ", strip=True)
+            text = text.replace(email, "").strip()
+            name = normalize_name(text)
+            if name:
+                return name
     
-    # Estrategia 6: Recurrir al padre
-    if parent:
-        return extract_name_advanced(parent, email)
+        # Estrategia 5: Buscar en divs con clases comunes
+        container = node.find_parent(['div', 'span', 'p'])
+        if container:
+            # Buscar texto antes del email en el mismo contenedor
+            full_text = container.get_text(separator=" ", strip=True)
+            email_pos = full_text.find(email)
+            if email_pos > 0:
+                before_email = full_text[:email_pos].strip()
+                # Tomar las últimas 2-4 palabras antes del email
+                words = before_email.split()[-4:]
+                if len(words) >= 2:
+                    name = normalize_name(" ".join(words))
+                    if name:
+                        return name
+        
+        # Estrategia 6: Recurrir al padre
+        if not parent:
+            return None
+        node = parent
     
     return None
 
@@ -170,13 +211,14 @@ def extract_emails_from_text(text):
     if not text:
         return []
     emails = EMAIL_PATTERN.findall(text)
-    return [clean_email(e) for e in emails if clean_email(e)]
+    # una sola llamada a clean_email por coincidencia
+    return [e for e in map(clean_email, emails) if e]
 
 
 def obtener_departamentos_con_nombres():
     """Obtiene lista de departamentos con sus nombres reales"""
     url = f"{BASE_URL}/conocenos/departamentos"
-    soup = get_soup(url)
+    soup = get_soup(url, parse_only=ANCHOR_STRAINER)
     if not soup:
         return []
     
@@ -240,7 +282,9 @@ def crawl_personal(start_url, departamento_nombre, max_pages=50, seen_emails=Non
         seen_emails = set()
     
     visited = set()
-    to_visit = [start_url]
+    # cola FIFO + conjunto de encolados: cada URL entra una sola vez en la frontera
+    to_visit = deque([start_url])
+    queued = {start_url}
     domain = urlparse(start_url).netloc
     
     resultados = []
@@ -248,19 +292,19 @@ def crawl_personal(start_url, departamento_nombre, max_pages=50, seen_emails=Non
     print(f"  [Crawling] Iniciando en: {start_url}")
     
     while to_visit and len(visited) < max_pages:
-        url = to_visit.pop(0)
-        if url in visited:
-            continue
+        url = to_visit.popleft()
         visited.add(url)
         
         soup = get_soup(url)
         if not soup:
             continue
         
-        # Estrategia 1: Buscar enlaces mailto: (más confiable)
+        # Estrategia 1: Buscar enlaces mailto: (más confiable). En la misma pasada
+        # se recogen los enlaces internos a seguir.
         for a in soup.find_all("a", href=True):
-            if a["href"].startswith("mailto:"):
-                email_raw = a["href"].replace("mailto:", "").strip()
+            href = a["href"]
+            if href.startswith("mailto:"):
+                email_raw = href.replace("mailto:", "").strip()
                 email = clean_email(email_raw)
                 
                 if email and email not in seen_emails:
@@ -272,10 +316,21 @@ def crawl_personal(start_url, departamento_nombre, max_pages=50, seen_emails=Non
                         # Intentar inferir desde el email
                         name_inferred = infer_name_from_email(email)
                         resultados.append((departamento_nombre, name_inferred, email))
+                continue
+            
+            # Enlaces internos: solo del mismo dominio, priorizando los que parecen
+            # de personal (o cualquiera mientras llevemos menos de 10 páginas)
+            new_url = abs_url(url, href)
+            if new_url not in queued and in_domain(new_url, domain):
+                if len(visited) < 10 or is_personal_link(a, href):
+                    queued.add(new_url)
+                    to_visit.append(new_url)
         
         # Estrategia 2: Buscar emails en texto plano
         page_text = soup.get_text()
-        text_emails = extract_emails_from_text(page_text)
+        # sin '@' en el texto no hay emails (ni en texto ni en tablas): solo se siguen enlaces
+        has_at = "@" in page_text
+        text_emails = extract_emails_from_text(page_text) if has_at else []
         
         for email in text_emails:
             if email not in seen_emails:
@@ -294,7 +349,7 @@ def crawl_personal(start_url, departamento_nombre, max_pages=50, seen_emails=Non
         
         # Estrategia 3: Buscar en estructuras específicas (tablas de personal)
         # Buscar tablas que puedan contener información de personal
-        tables = soup.find_all("table")
+        tables = soup.find_all("table") if has_at else []
         for table in tables:
             rows = table.find_all("tr")
             for row in rows:
@@ -317,25 +372,6 @@ def crawl_personal(start_url, departamento_nombre, max_pages=50, seen_emails=Non
                         name = potential_name if potential_name else infer_name_from_email(potential_email)
                         resultados.append((departamento_nombre, name, potential_email))
         
-        # Añadir enlaces internos relevantes
-        for a in soup.find_all("a", href=True):
-            href = a.get("href", "")
-            text = a.get_text(strip=True).lower()
-            
-            # Priorizar enlaces que parecen ser de personal
-            keywords = ["personal", "profesor", "profesores", "plantilla", "staff", 
-                       "miembros", "equipo", "directorio", "listado"]
-            
-            is_relevant = any(kw in text or kw in href.lower() for kw in keywords)
-            
-            new_url = urljoin(url, href)
-            parsed = urlparse(new_url)
-            
-            # Solo enlaces del mismo dominio
-            if parsed.netloc == domain and new_url not in visited:
-                if is_relevant or len(visited) < 10:  # Priorizar relevantes o primeros 10
-                    to_visit.append(new_url)
-        
         time.sleep(0.3)  # Pausa más corta pero respetuosa
     
     print(f"  [Crawling] Completado: {len(resultados)} emails encontrados en {len(visited)} páginas")
@@ -347,28 +383,23 @@ def infer_name_from_email(email):
     if not email:
         return None
     
-    # Patrón común: nombre.apellido@uc3m.es
-    local_part = email.split("@")[0]
-    
-    # Dividir por puntos
-    parts = local_part.split(".")
-    
-    if len(parts) >= 2:
-        # Tomar las primeras partes como nombre y apellido
-        name_parts = []
-        for part in parts[:3]:  # Máximo 3 partes
-            if part and len(part) > 2:
-                name_parts.append(part.capitalize())
-        
-        if len(name_parts) >= 2:
-            return " ".join(name_parts)
+    # Patrón común: nombre.apellido@uc3m.es -> hasta 3 partes separadas por puntos,
+    # sin split() de la cadena completa
+    local_part = email.partition("@")[0]
+    first, dot, rest = local_part.partition(".")
+    if not dot:
+        return None
+    second, _, rest = rest.partition(".")
+    third = rest.partition(".")[0]
     
-    return None
+    # Tomar las partes con más de 2 letras como nombre y apellido(s)
+    name_parts = [part.capitalize() for part in (first, second, third) if len(part) > 2]
+    return " ".join(name_parts) if len(name_parts) >= 2 else None
 
 
 def guardar_csv(data, filename="profesores_uc3m_v4.csv"):
     """Guarda los datos en CSV con encoding UTF-8"""
-    with open(filename, "w", newline="", encoding="utf-8") as f:
+    with open(filename, "w", newline="", encoding="utf-8", buffering=1024 * 1024) as f:
         writer = csv.writer(f)
         writer.writerow(["departamento", "profesor", "email"])
         writer.writerows(data)
@@ -381,7 +412,7 @@ def main():
     print("=" * 60)
     
     # Obtener departamentos con nombres
-    print("\n[1/4] Obteniendo lista de departamentos...")
+    print("\n[1/3] Obteniendo lista de departamentos...")
     departamentos = obtener_departamentos_con_nombres()
     print(f"✓ Encontrados {len(departamentos)} departamentos")
     
@@ -394,7 +425,7 @@ def main():
     datos_finales = []
     estadisticas = defaultdict(int)
     
-    print("\n[2/4] Procesando departamentos...")
+    print("\n[2/3] Procesando departamentos...")
     for idx, (dep_url, dep_nombre) in enumerate(departamentos, 1):
         print(f"\n[{idx}/{len(departamentos)}] {dep_nombre}")
         print(f"  URL: {dep_url}")
@@ -423,20 +454,11 @@ def main():
         
         time.sleep(0.5)  # Pausa entre departamentos
     
-    print("\n[3/4] Eliminando duplicados finales...")
-    # Eliminar duplicados finales (por si acaso)
-    emails_vistos = set()
-    datos_unicos = []
-    for dep, prof, email in datos_finales:
-        if email and email not in emails_vistos:
-            emails_vistos.add(email)
-            datos_unicos.append((dep, prof, email))
-    
-    duplicados_eliminados = len(datos_finales) - len(datos_unicos)
-    if duplicados_eliminados > 0:
-        print(f"  ✓ Eliminados {duplicados_eliminados} duplicados adicionales")
+    # Cada fila entra en datos_finales tras comprobar seen_emails_global (también dentro
+    # de crawl_personal), así que ya no hay emails repetidos: no hace falta otra pasada
+    datos_unicos = datos_finales
     
-    print("\n[4/4] Guardando resultados...")
+    print("\n[3/3] Guardando resultados...")
     guardar_csv(datos_unicos, "profesores_uc3m_v4.csv")
     
     # Estadísticas finales
@@ -444,7 +466,7 @@ def main():
     print("ESTADÍSTICAS FINALES")
     print("=" * 60)
     print(f"Total registros: {len(datos_unicos)}")
-    print(f"Emails únicos: {len(emails_vistos)}")
+    print(f"Emails únicos: {len(seen_emails_global)}")
     
     # Contar profesores con nombre
     con_nombre = sum(1 for _, prof, _ in datos_unicos if prof and prof != "Departamento")